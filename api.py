@@ -0,0 +1,185 @@
+# api.py
+# Versioned JSON API. Serves the same data as the HTML pages, from the same
+# db.py functions, as compact JSON.
+#
+# List endpoints return {"data": [...], "next_cursor": ...}. Pass next_cursor
+# back as ?cursor= to get the following page (keyset pagination; the cursor is
+# opaque to clients). ?limit= sets the page size and ?fields=a,b picks the
+# fields of each item. Lists carry a short excerpt of each article; the full
+# contents come with /articles/<id>. Every response carries an ETag, so
+# clients can revalidate with If-None-Match and get a 304.
+import base64
+import binascii
+import json
+
+from flask import Blueprint, jsonify, request, session
+
+from db import (
+    get_dashboard_page,
+    get_article,
+    get_article_categories,
+    get_article_ratings,
+    get_user_profile,
+    get_user_ratings,
+    get_low_credibility_articles,
+    get_search_facets,
+    search_articles_db
+)
+from search import HIGHLIGHT_END, HIGHLIGHT_START, filters_from_args, resolve_sort, sort_key
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api_v1.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify({'error': e.message}), e.status
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """The (sort value, id) pair behind a cursor, or None for the first page."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise ApiError("invalid cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ApiError("invalid cursor")
+    # Both values are bound as SQL parameters; JSON true/false would pass as int
+    value, row_id = values
+    if (not isinstance(value, (str, int, float)) or isinstance(value, bool)
+            or not isinstance(row_id, int) or isinstance(row_id, bool)):
+        raise ApiError("invalid cursor")
+    return values
+
+def page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def select_fields(items, available):
+    """Keep only the fields named in ?fields= (all of them by default)."""
+    fields = request.args.get('fields')
+    if not fields:
+        return items
+    wanted = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in wanted if f not in available]
+    if unknown:
+        raise ApiError(f"unknown fields: {', '.join(unknown)}")
+    return [{f: item[f] for f in wanted} for item in items]
+
+def split_page(rows, limit, key):
+    """Rows were fetched with limit + 1; returns (rows, next cursor or None)."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(key(rows[-1]))
+    return rows, None
+
+def conditional_json(payload):
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+def list_response(rows, next_cursor, **extra):
+    items = [dict(row) for row in rows]
+    if items:
+        items = select_fields(items, items[0].keys())
+    return conditional_json({'data': items, 'next_cursor': next_cursor, **extra})
+
+def keyset(sort_column, id_column):
+    return lambda row: (row[sort_column], row[id_column])
+
+# ============ ARTICLES ============
+
+@api_v1.route('/articles')
+def list_articles():
+    if 'username' not in session:
+        raise ApiError("login required", 401)
+    before = decode_cursor(request.args.get('cursor'))
+    articles, next_key = get_dashboard_page(*(before or (None, None)), limit=page_size())
+    next_cursor = encode_cursor(next_key) if next_key else None
+    return list_response(articles, next_cursor)
+
+@api_v1.route('/articles/<int:article_id>')
+def article(article_id):
+    row = get_article(article_id)
+    if row is None:
+        raise ApiError("article not found", 404)
+    limit = page_size()
+    ratings, ratings_cursor = split_page(get_article_ratings(article_id, limit=limit + 1), limit,
+                                         keyset('rating_date', 'rating_id'))
+    item = dict(row)
+    item['categories'] = get_article_categories(article_id)
+    item['ratings'] = [dict(r) for r in ratings]
+    item['ratings_next_cursor'] = ratings_cursor
+    return conditional_json({'data': select_fields([item], item.keys())[0]})
+
+@api_v1.route('/articles/<int:article_id>/ratings')
+def article_ratings(article_id):
+    before = decode_cursor(request.args.get('cursor')) or (None, None)
+    limit = page_size()
+    rows = get_article_ratings(article_id, before[0], before[1], limit=limit + 1)
+    return list_response(*split_page(rows, limit, keyset('rating_date', 'rating_id')))
+
+@api_v1.route('/search')
+def search():
+    filters = filters_from_args(request.args)
+    after = decode_cursor(request.args.get('cursor'))
+    limit = page_size()
+    try:
+        sort = resolve_sort(request.args.get('sort') or None, filters.get('q'), filters.get('title'))
+        rows = search_articles_db(sort=sort, after=after, limit=limit + 1, **filters)
+        # Facet counts only on request, and only with the first page
+        extra = {'facets': get_search_facets(**filters)} if request.args.get('facets') and after is None else {}
+    except ValueError as e:
+        raise ApiError(str(e))
+    rows, next_cursor = split_page(rows, limit, lambda row: sort_key(sort, row))
+    items = []
+    for row in rows:
+        item = dict(row)
+        if 'snippet' in item:
+            # Search-page markup is for HTML; the API gives plain text
+            item.pop('title_highlight')
+            item['snippet'] = item['snippet'].replace(HIGHLIGHT_START, '').replace(HIGHLIGHT_END, '')
+        items.append(item)
+    return list_response(items, next_cursor, **extra)
+
+@api_v1.route('/low_credibility')
+def low_credibility():
+    before = decode_cursor(request.args.get('cursor')) or (None, None)
+    limit = page_size()
+    rows = get_low_credibility_articles(before[0], before[1], limit=limit + 1)
+    return list_response(*split_page(rows, limit, keyset('publication_date', 'article_id')))
+
+# ============ USERS ============
+
+@api_v1.route('/users/<int:user_id>')
+def user(user_id):
+    row = get_user_profile(user_id)
+    if row is None:
+        raise ApiError("user not found", 404)
+    item = dict(row)
+    # Email addresses only go to the user themselves and admins
+    if session.get('user_id') != user_id and session.get('role') != 'admin':
+        item.pop('email')
+    return conditional_json({'data': select_fields([item], item.keys())[0]})
+
+@api_v1.route('/users/<int:user_id>/ratings')
+def user_ratings(user_id):
+    before = decode_cursor(request.args.get('cursor')) or (None, None)
+    limit = page_size()
+    rows = get_user_ratings(user_id, before[0], before[1], limit=limit + 1)
+    return list_response(*split_page(rows, limit, keyset('rating_date', 'rating_id')))
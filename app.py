@@ -1,11 +1,32 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 import os
+import sqlite3
+from markupsafe import Markup, escape
 from werkzeug.utils import secure_filename
+from scoring_queue import notify_scoring_workers, start_scoring_workers, get_scoring_stats
+from purge_worker import notify_purge_worker, start_purge_worker, get_purge_stats
+from bulk_import import FORMATS as IMPORT_FORMATS, detect_format, import_articles, open_text
+from export import DATASETS as EXPORT_DATASETS, EXPORT_FORMATS, export_dataset, export_filename
+from api import api_v1
+import metrics
+from response_cache import cached_page, get_page_cache_stats
+from search import (CATEGORY_MATCHES, HIGHLIGHT_END, HIGHLIGHT_START, SORTS, check_filters,
+                    filters_from_args, parse_after, resolve_sort, sort_key)
+from slow_queries import SLOW_QUERY_MS, recent_slow_queries
+from ml import get_model_stats
 from db import (
     check_user_credentials,
+    check_user_password,
     get_user_id,
-    get_all_articles,
+    get_user_identity,
+    get_dashboard_page,
+    get_comments_for_articles,
+    get_article,
+    get_article_categories,
+    get_article_ratings,
+    get_user_profile,
+    get_user_ratings,
     rate_article,
     mark_article_as_fake,
     get_connection,
@@ -13,20 +34,84 @@ from db import (
     get_low_credibility_articles,
     register_user,
     get_categories,
+    get_category_names,
+    get_category_cache_stats,
     insert_article_category,
+    load_or_train_ml_model,
     ml_analyze_article,
     update_ml_score,
     search_articles_db,
+    get_search_facets,
+    get_facet_cache_stats,
     add_category,
     remove_category,
-    remove_article,
+    remove_articles,
+    remove_user,
+    set_articles_fake,
+    get_admin_users,
     update_password,
-    create_article
+    update_profile,
+    create_article,
+    get_pool_stats,
+    get_writer_stats,
+    get_user_cache_stats,
+    init_app as init_db
 )
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')  # Make sure to set this in Render's environment variables
 
+# One pooled database connection per request, returned on teardown
+init_db(app)
+
+# JSON API under /api/v1, sharing db.py with the HTML pages
+app.register_blueprint(api_v1)
+
+# Request/SQL/render timing and the Prometheus /metrics endpoint
+metrics.init_app(app)
+
+def collect_app_metrics():
+    pool = get_pool_stats()
+    model = get_model_stats()
+    users = get_user_cache_stats()
+    pages = get_page_cache_stats()
+    facets = get_facet_cache_stats()
+    categories = get_category_cache_stats()
+    writes = get_writer_stats()
+    return [
+        ('unfake_db_pool_connections_open', 'gauge', "Pooled connections open", pool['open']),
+        ('unfake_db_pool_connections_in_use', 'gauge', "Pooled connections checked out", pool['in_use']),
+        ('unfake_db_pool_checkout_waits_total', 'counter', "Checkouts that had to wait", pool['checkout_waits']),
+        ('unfake_db_pool_checkout_wait_seconds_total', 'counter', "Time spent waiting for a connection",
+         pool['checkout_wait_seconds']),
+        ('unfake_db_write_queue_depth', 'gauge', "Writes waiting for the writer thread", writes['queued']),
+        ('unfake_db_writes_total', 'counter', "Writes run by the writer thread", writes['writes']),
+        ('unfake_db_write_errors_total', 'counter', "Writes that raised and were rolled back", writes['errors']),
+        ('unfake_db_write_timeouts_total', 'counter', "Writes dropped after waiting too long to start",
+         writes['timeouts']),
+        ('unfake_ml_inference_calls_total', 'counter', "Model predict calls", model['inference_calls']),
+        ('unfake_ml_inference_texts_total', 'counter', "Texts scored by the model", model['inference_texts']),
+        ('unfake_ml_inference_seconds_total', 'counter', "Time spent in the model", model['inference_seconds_total']),
+        ('unfake_ml_budget_timeouts_total', 'counter', "Scores that ran over the time budget", model['budget_timeouts']),
+        ('unfake_user_cache_hits_total', 'counter', "User identity cache hits", users['hits']),
+        ('unfake_user_cache_misses_total', 'counter', "User identity cache misses", users['misses']),
+        ('unfake_page_cache_entries', 'gauge', "Rendered pages cached", pages['size']),
+        ('unfake_page_cache_hits_total', 'counter', "Page cache hits", pages['hits']),
+        ('unfake_page_cache_misses_total', 'counter', "Page cache misses", pages['misses']),
+        ('unfake_page_cache_invalidations_total', 'counter', "Cached pages dropped by writes",
+         pages['invalidations']),
+        ('unfake_facet_cache_hits_total', 'counter', "Search facet cache hits", facets['hits']),
+        ('unfake_facet_cache_misses_total', 'counter', "Search facet cache misses", facets['misses']),
+        ('unfake_category_cache_hits_total', 'counter', "Category lookups served from memory", categories['hits']),
+        ('unfake_category_cache_reloads_total', 'counter', "Times the categories were read from the database",
+         categories['reloads']),
+    ]
+
+metrics.register_collector(collect_app_metrics)
+
+# Load the credibility model once per worker process so requests score warm
+load_or_train_ml_model()
+
 # Configure for production
 if os.environ.get('FLASK_ENV') == 'production':
     app.config['SESSION_COOKIE_SECURE'] = True
@@ -42,9 +127,55 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # Configure allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Number of articles shown per dashboard page
+DASHBOARD_PAGE_SIZE = 20
+
+# Number of results shown per search page
+SEARCH_PAGE_SIZE = 20
+
+# Rows per page in the admin panel's article and user tables
+ADMIN_PAGE_SIZE = 50
+# Search filters offered on the admin panel's article table
+ADMIN_ARTICLE_FILTERS = ('title', 'is_fake', 'min_ml_score', 'max_ml_score', 'username')
+
+# Rejected records listed on the import result page (the rest are only counted)
+IMPORT_REJECTS_SHOWN = 100
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.template_filter('highlight')
+def highlight_filter(text):
+    """Escape search snippets and turn the FTS match markers into <mark> tags."""
+    escaped = str(escape(text or ''))
+    return Markup(escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+@app.template_global()
+def search_url(page_args, **changes):
+    """/search with the current filters (page_args) changed, from the first page."""
+    return url_for('search_articles', **{**page_args, **changes})
+
+def current_user_id():
+    """user_id of the logged-in user, from the session (or looked up once for older sessions)."""
+    if 'user_id' not in session:
+        identity = get_user_identity(session['username'])
+        if not identity:
+            return None
+        session['user_id'], session['role'] = identity
+    return session['user_id']
+
+def is_admin():
+    return 'username' in session and session.get('role') == 'admin'
+
+@app.before_request
+def load_session_identity():
+    # Sessions from before user_id/role were stored at login get them once here
+    if 'username' in session and 'role' not in session:
+        current_user_id()
+    # A removed user's session ends with their next request (a cache hit otherwise)
+    if 'username' in session and get_user_identity(session['username']) is None:
+        session.clear()
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -54,8 +185,12 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        if check_user_credentials(username, password):
+        user = check_user_credentials(username, password)
+        if user:
+            # Keep the identity in the session so later requests need no lookup
             session['username'] = username
+            session['user_id'] = user['user_id']
+            session['role'] = user['role']
             flash("Login successful!")
             return redirect(url_for('dashboard'))
         else:
@@ -66,6 +201,8 @@ def login():
 @app.route('/logout')
 def logout():
     session.pop('username', None)
+    session.pop('user_id', None)
+    session.pop('role', None)
     flash("You have been logged out.")
     return redirect(url_for('home'))
 
@@ -76,28 +213,22 @@ def dashboard():
         return redirect(url_for('login'))
 
     user = session['username']
-    articles = get_all_articles()
 
-    # gather comments
-    conn = get_connection()
-    cur = conn.cursor()
-    comments_dict = {}
-    for art in articles:
-        article_id = art['article_id']
-        cur.execute("""
-            SELECT r.comment, r.rating_value, r.user_id, u.username
-            FROM ratings r
-            JOIN users u ON r.user_id = u.user_id
-            WHERE r.article_id = ?
-        """, (article_id,))
-        these_comments = cur.fetchall()
-        comments_dict[article_id] = these_comments
-    conn.close()
+    # keyset pagination: the cursor is the (date, id) of the last article shown
+    before_date = request.args.get('before_date')
+    before_id = request.args.get('before_id', type=int)
+    articles, next_cursor = get_dashboard_page(before_date, before_id,
+                                               limit=DASHBOARD_PAGE_SIZE)
+
+    # gather comments for the whole page in one query
+    comments_dict = get_comments_for_articles([art['article_id'] for art in articles])
 
     return render_template('dashboard.html',
                            username=user,
                            articles=articles,
-                           comments_dict=comments_dict)
+                           comments_dict=comments_dict,
+                           next_cursor=next_cursor,
+                           is_first_page=before_id is None)
 
 @app.route('/rate', methods=['POST'])
 def rate():
@@ -105,104 +236,133 @@ def rate():
         flash("Please log in first.")
         return redirect(url_for('login'))
 
-    user_id = get_user_id(session['username'])
+    user_id = current_user_id()
     article_id = request.form.get('article_id')
 
-    conn = get_connection()
-    cur = conn.cursor()
-    # check if user already rated
-    cur.execute("SELECT rating_id FROM ratings WHERE user_id=? AND article_id=?", (user_id, article_id))
-    existing = cur.fetchone()
-    if existing:
-        flash("You have already rated this article!")
-        conn.close()
-        return redirect(url_for('dashboard'))
-
     rating_value = request.form.get('rating_value')
     comment = request.form.get('comment', "")
-    cur.execute("""
-        INSERT INTO ratings (user_id, article_id, rating_value, comment)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, article_id, rating_value, comment))
-    conn.commit()
-    conn.close()
+    # Saved in a group commit with other ratings arriving at the same moment
+    try:
+        rated = rate_article(user_id, article_id, rating_value, comment)
+    except sqlite3.IntegrityError:
+        flash(f"Article {article_id} can't be rated {rating_value}.")
+        return redirect(url_for('dashboard'))
+    if not rated:
+        flash("You have already rated this article!")
+        return redirect(url_for('dashboard'))
 
     flash(f"Article {article_id} rated {rating_value}!")
     return redirect(url_for('dashboard'))
 
 @app.route('/admin/mark_fake', methods=['POST'])
 def admin_mark_fake():
-    if 'username' not in session:
-        flash("Please log in first.")
+    if not is_admin():
+        flash("Admin only.")
         return redirect(url_for('login'))
     article_id = request.form.get('article_id')
     mark_article_as_fake(article_id, True)
     flash(f"Article {article_id} marked as fake.")
     return redirect(url_for('dashboard'))
 
+@app.route('/admin/scoring_queue')
+def admin_scoring_queue():
+    if not is_admin():
+        flash("Admin only.")
+        return redirect(url_for('login'))
+    return jsonify(get_scoring_stats())
+
+@app.route('/admin/purge_queue')
+def admin_purge_queue():
+    if not is_admin():
+        flash("Admin only.")
+        return redirect(url_for('login'))
+    return jsonify(get_purge_stats())
+
+@app.route('/admin/slow_queries')
+def admin_slow_queries():
+    if not is_admin():
+        flash("Admin only.")
+        return redirect(url_for('login'))
+    limit = request.args.get('limit', 100, type=int)
+    return render_template('admin_slow_queries.html', entries=recent_slow_queries(limit),
+                           threshold_ms=SLOW_QUERY_MS)
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+def admin_import():
+    if not is_admin():
+        flash("Admin only.")
+        return redirect(url_for('login'))
+
+    if request.method == 'GET':
+        return render_template('admin_import.html', formats=IMPORT_FORMATS)
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash("Please choose a file to import.")
+        return redirect(url_for('admin_import'))
+    fmt = request.form.get('format') or detect_format(upload.filename)
+    if fmt not in IMPORT_FORMATS:
+        flash("Unknown file format; choose JSONL or CSV.")
+        return redirect(url_for('admin_import'))
+
+    rejects = []
+    def on_reject(line_number, error, record):
+        if len(rejects) < IMPORT_REJECTS_SHOWN:
+            rejects.append({'line': line_number, 'error': error})
+
+    try:
+        # The upload is parsed as it is read; werkzeug spools large files to disk
+        stats = import_articles(open_text(upload.stream), fmt, current_user_id(),
+                                default_author=session['username'], on_reject=on_reject)
+    except Exception as e:
+        flash(f"Import failed: {str(e)}")
+        return redirect(url_for('admin_import'))
+
+    if stats['pending_scoring']:
+        notify_scoring_workers()
+    return render_template('admin_import.html', formats=IMPORT_FORMATS, stats=stats, rejects=rejects)
+
+@app.route('/admin/export/<dataset>')
+def admin_export(dataset):
+    if not is_admin():
+        flash("Admin only.")
+        return redirect(url_for('login'))
+    fmt = request.args.get('format', 'ndjson')
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'unknown dataset or format'}), 404
+    compress = request.args.get('gzip') in ('1', 'true', 'yes')
+
+    # Same filters as /search; rows are streamed straight from the cursor
+    filters = filters_from_args(request.args)
+    try:
+        # Malformed filters fail here, not halfway through the download
+        check_filters(**filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    chunks = export_dataset(dataset, fmt, compress, **filters)
+    if compress:
+        mimetype = 'application/gzip'
+    elif fmt == 'csv':
+        mimetype = 'text/csv'
+    else:
+        mimetype = 'application/x-ndjson'
+    filename = export_filename(dataset, fmt, compress)
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @app.route('/article/<int:article_id>')
+@cached_page('article:{article_id}', 'categories')
 def article_detail(article_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT a.article_id, a.title, a.contents, a.author_name,
-               a.publication_date, a.overall_rating, a.is_fake,
-               a.submitter_id, IFNULL(u.username,'Unknown') AS submitter_name,
-               a.ml_score, a.source_link
-        FROM articles a
-        LEFT JOIN users u ON a.submitter_id = u.user_id
-        WHERE a.article_id = ?
-    """, (article_id,))
-    article = cur.fetchone()
-
-    cur.execute("""
-        SELECT c.category_name
-        FROM categories c
-        JOIN article_category ac ON c.category_id = ac.category_id
-        WHERE ac.article_id = ?
-    """, (article_id,))
-    categories = [row[0] for row in cur.fetchall()]
-
-    cur.execute("""
-        SELECT r.rating_value, r.comment, r.user_id, u.username, r.rating_date
-        FROM ratings r
-        JOIN users u ON r.user_id = u.user_id
-        WHERE r.article_id = ?
-        ORDER BY r.rating_date DESC
-    """, (article_id,))
-    ratings_list = cur.fetchall()
-
-    conn.close()
     return render_template('article_detail.html',
-                           article=article,
-                           categories=categories,
-                           ratings_list=ratings_list)
+                           article=get_article(article_id),
+                           categories=get_article_categories(article_id),
+                           ratings_list=get_article_ratings(article_id))
 
 @app.route('/user/<int:user_id>')
 def user_profile(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT user_id, username, email, join_date, profile_picture, bio
-        FROM users
-        WHERE user_id=?
-    """, (user_id,))
-    user = cur.fetchone()
-
-    cur.execute("""
-        SELECT a.article_id, a.title, r.rating_value, r.comment, r.rating_date
-        FROM ratings r
-        JOIN articles a ON r.article_id = a.article_id
-        WHERE r.user_id = ?
-        ORDER BY r.rating_date DESC
-    """, (user_id,))
-    rated_articles = cur.fetchall()
-
-    conn.close()
     return render_template('user_profile.html',
-                           user=user,
-                           rated_articles=rated_articles,
+                           user=get_user_profile(user_id),
+                           rated_articles=get_user_ratings(user_id),
                            user_id=user_id)
 
 @app.route('/edit_profile/<int:user_id>', methods=['GET','POST'])
@@ -211,9 +371,6 @@ def edit_profile(user_id):
         flash("Please log in first.")
         return redirect(url_for('login'))
 
-    conn = get_connection()
-    cur = conn.cursor()
-
     if request.method == 'POST':
         try:
             new_bio = request.form.get('bio', '')
@@ -229,19 +386,16 @@ def edit_profile(user_id):
                     flash("Invalid file type. Allowed types: png, jpg, jpeg, gif")
                     return redirect(url_for('edit_profile', user_id=user_id))
 
-            sql = "UPDATE users SET bio=?, profile_picture=? WHERE user_id=?"
-            cur.execute(sql, (new_bio, pic_path, user_id))
-            conn.commit()
+            update_profile(user_id, new_bio, pic_path)
             flash("Profile updated successfully.")
             return redirect(url_for('user_profile', user_id=user_id))
         except Exception as e:
-            conn.rollback()
             flash(f"Error updating profile: {str(e)}")
             return redirect(url_for('edit_profile', user_id=user_id))
-        finally:
-            conn.close()
 
+    conn = get_connection()
     try:
+        cur = conn.cursor()
         cur.execute("SELECT bio, profile_picture FROM users WHERE user_id=?", (user_id,))
         row = cur.fetchone()
         return render_template('edit_profile.html', 
@@ -256,110 +410,125 @@ def edit_profile(user_id):
 
 @app.route('/admin', methods=['GET','POST'])
 def admin_panel():
-    if 'username' not in session or session['username'] != 'admin_user':
+    if not is_admin():
         flash("Admin only.")
         return redirect(url_for('login'))
 
-    conn = get_connection()
-    cur = conn.cursor()
-
     if request.method == 'POST':
-        # Handle Removing Articles
-        if 'remove_article_id' in request.form:
-            article_id = request.form['remove_article_id']
-            # Optional: Confirm the article exists before deleting
-            cur.execute("SELECT title FROM articles WHERE article_id=?", (article_id,))
-            article = cur.fetchone()
-            if article:
-                remove_article(article_id)
-                flash(f"Article '{article['title']}' (ID: {article_id}) deleted.")
-            else:
-                flash("Article not found.")
-
-        # Handle Marking Articles as Real
-        elif 'mark_real_id' in request.form:
-            article_id = request.form['mark_real_id']
-            cur.execute("SELECT title FROM articles WHERE article_id=?", (article_id,))
-            article = cur.fetchone()
-            if article:
-                mark_article_as_fake(article_id, False)
-                flash(f"Article '{article['title']}' (ID: {article_id}) marked as real.")
-            else:
-                flash("Article not found.")
-
-        # Handle Removing Users
-        elif 'remove_user_id' in request.form:
-            remove_id = request.form['remove_user_id']
-            cur.execute("SELECT username FROM users WHERE user_id=?", (remove_id,))
-            user = cur.fetchone()
-            if user:
-                remove_user(remove_id)  # You need to define this function similar to remove_article
-                flash(f"User '{user['username']}' (ID: {remove_id}) removed.")
-            else:
-                flash("User not found.")
-
-        # Handle Adding New Categories
-        elif 'new_category' in request.form:
-            new_cat = request.form['new_category'].strip()
-            description = request.form.get('new_category_description', '').strip()
-            if new_cat:
-                success = add_category(new_cat, description)
-                if success:
-                    flash(f"Category '{new_cat}' added.")
-                else:
-                    flash(f"Category '{new_cat}' already exists.")
-            else:
-                flash("Category name cannot be empty.")
-
-        # Handle Removing Categories
-        elif 'remove_category_id' in request.form:
-            category_id = request.form['remove_category_id']
-            cur.execute("SELECT category_name FROM categories WHERE category_id=?", (category_id,))
-            category = cur.fetchone()
-            if category:
-                remove_category(category_id)
-                flash(f"Category '{category['category_name']}' removed.")
-            else:
-                flash("Category not found.")
-
-    # Fetch articles, users, and categories
-    cur.execute("SELECT article_id, title, is_fake FROM articles ORDER BY article_id")
-    articles_list = cur.fetchall()
-
-    cur.execute("SELECT user_id, username FROM users ORDER BY user_id")
-    users_list = cur.fetchall()
-
-    cur.execute("SELECT category_id, category_name FROM categories ORDER BY category_name")
-    categories_list = cur.fetchall()
+        admin_action()
+        # Back to the same filters and page, so a reload doesn't repeat the action
+        return redirect(url_for('admin_panel', **request.args.to_dict(flat=False)))
 
-    conn.close()
+    filters = {k: v for k, v in filters_from_args(request.args).items() if k in ADMIN_ARTICLE_FILTERS}
+    # keyset pagination like /search: newest first, the cursor is the last article's (date, id)
+    try:
+        after = parse_after('newest', request.args.get('after'), request.args.get('after_id'))
+        rows = search_articles_db(sort='newest', after=after, limit=ADMIN_PAGE_SIZE + 1, **filters)
+        error = None
+    except ValueError as e:
+        after, rows, error = None, [], str(e)
+    next_cursor = sort_key('newest', rows[ADMIN_PAGE_SIZE - 1]) if len(rows) > ADMIN_PAGE_SIZE else None
+
+    user_prefix = request.args.get('user_prefix') or None
+    users_after = request.args.get('users_after') or None
+    users = get_admin_users(user_prefix, users_after, limit=ADMIN_PAGE_SIZE + 1)
+    next_user = users[ADMIN_PAGE_SIZE - 1]['username'] if len(users) > ADMIN_PAGE_SIZE else None
+
+    page_args = {k: v for k, v in request.args.lists() if k not in ('after', 'after_id', 'users_after')}
     return render_template(
         'admin.html',
-        articles=articles_list,
-        users=users_list,
-        categories=categories_list
+        articles=rows[:ADMIN_PAGE_SIZE],
+        next_cursor=next_cursor,
+        users=users[:ADMIN_PAGE_SIZE],
+        next_user=next_user,
+        users_after=users_after,
+        is_first_page=after is None,
+        page_args=page_args,
+        args=request.args,
+        error=error,
+        categories=get_categories()
     )
 
+def admin_action():
+    """Carry out one POST from the admin panel and flash a summary of it."""
+    # Bulk moderation: every selected article in one UPDATE/DELETE ... IN
+    action = request.form.get('action')
+    if action in ('mark_fake', 'mark_real', 'delete'):
+        article_ids = request.form.getlist('article_id', type=int)
+        if not article_ids:
+            flash("No articles selected.")
+        elif action == 'delete':
+            removed = remove_articles(article_ids)
+            notify_purge_worker()
+            flash(f"Deleted {removed} of {len(article_ids)} selected articles.")
+        else:
+            updated = set_articles_fake(article_ids, action == 'mark_fake')
+            label = 'fake' if action == 'mark_fake' else 'real'
+            flash(f"Marked {updated} of {len(article_ids)} selected articles as {label}.")
+
+    # Handle Removing Users
+    elif 'remove_user_id' in request.form:
+        remove_id = request.form.get('remove_user_id', type=int)
+        user = get_user_profile(remove_id)
+        if user and remove_user(remove_id):
+            notify_purge_worker()
+            flash(f"User '{user['username']}' (ID: {remove_id}) removed.")
+        else:
+            flash("User not found.")
+
+    # Handle Adding New Categories
+    elif 'new_category' in request.form:
+        new_cat = request.form['new_category'].strip()
+        description = request.form.get('new_category_description', '').strip()
+        if new_cat:
+            success = add_category(new_cat, description)
+            if success:
+                flash(f"Category '{new_cat}' added.")
+            else:
+                flash(f"Category '{new_cat}' already exists.")
+        else:
+            flash("Category name cannot be empty.")
+
+    # Handle Removing Categories
+    elif 'remove_category_id' in request.form:
+        category_id = request.form.get('remove_category_id', type=int)
+        category_name = get_category_names().get(category_id)
+        if category_name:
+            remove_category(category_id)
+            flash(f"Category '{category_name}' removed.")
+        else:
+            flash("Category not found.")
+
 @app.route('/search', methods=['GET'])
+@cached_page('articles', 'categories')
 def search_articles():
-    # We'll call the dynamic search function from db
-    from db import search_articles_db
-    cat = request.args.get('category', None)
-    min_rating = request.args.get('min_rating', None)
-    date = request.args.get('publication_date', None)
-    username = request.args.get('username', None)
-
-    # If user used the search form, we pass these values:
-    results = search_articles_db(category=cat, min_rating=min_rating,
-                                 publication_date=date, username=username)
-    return render_template('search.html', results=results)
+    filters = filters_from_args(request.args)
+    form = {'args': request.args, 'categories': get_categories(), 'sorts': SORTS,
+            'category_matches': CATEGORY_MATCHES, 'selected_categories': filters.get('category') or []}
+    try:
+        sort = resolve_sort(request.args.get('sort') or None, filters.get('q'), filters.get('title'))
+        # keyset pagination: the cursor is the sort value and id of the last result shown
+        after = parse_after(sort, request.args.get('after'), request.args.get('after_id'))
+        rows = search_articles_db(sort=sort, after=after, limit=SEARCH_PAGE_SIZE + 1, **filters)
+        facets = get_search_facets(**filters)
+    except ValueError as e:
+        return render_template('search.html', results=[], error=str(e), **form), 400
+
+    next_cursor = sort_key(sort, rows[SEARCH_PAGE_SIZE - 1]) if len(rows) > SEARCH_PAGE_SIZE else None
+    # The next page keeps every filter and replaces the cursor
+    page_args = {k: v for k, v in request.args.lists() if k not in ('after', 'after_id')}
+    return render_template('search.html', results=rows[:SEARCH_PAGE_SIZE], sort=sort,
+                           next_cursor=next_cursor, page_args=page_args, is_first_page=after is None,
+                           facets=facets, **form)
 
 @app.route('/top_raters')
+@cached_page('ratings')
 def top_raters():
     top3 = get_top_3_users()
     return render_template('top_raters.html', top3=top3)
 
 @app.route('/low_credibility')
+@cached_page('articles')
 def low_credibility():
     rows = get_low_credibility_articles()
     return render_template('low_credibility.html', articles=rows)
@@ -398,7 +567,7 @@ def submit_article():
                 return redirect(url_for('submit_article'))
 
             # Get user ID
-            user_id = get_user_id(session['username'])
+            user_id = current_user_id()
             if not user_id:
                 flash("Error: User not found.")
                 return redirect(url_for('login'))
@@ -414,6 +583,8 @@ def submit_article():
             )
 
             if article_id:
+                # The article is saved; its ML score is computed in the background
+                notify_scoring_workers()
                 flash("Article submitted successfully!")
                 return redirect(url_for('dashboard'))
             else:
@@ -433,7 +604,7 @@ def my_profile():
     if 'username' not in session:
         flash("Please log in.")
         return redirect(url_for('login'))
-    uid = get_user_id(session['username'])
+    uid = current_user_id()
     return redirect(url_for('user_profile', user_id=uid))
 
 @app.route('/change_password', methods=['GET', 'POST'])
@@ -447,7 +618,7 @@ def change_password():
         new_password = request.form['new_password']
         confirm_password = request.form['confirm_password']
         
-        if not check_user_credentials(session['username'], current_password):
+        if not check_user_password(current_user_id(), current_password):
             flash("Current password is incorrect!")
             return redirect(url_for('change_password'))
             
@@ -455,7 +626,7 @@ def change_password():
             flash("New passwords do not match!")
             return redirect(url_for('change_password'))
             
-        if update_password(session['username'], new_password):
+        if update_password(current_user_id(), new_password):
             flash("Password updated successfully!")
             return redirect(url_for('dashboard'))
         else:
@@ -464,4 +635,6 @@ def change_password():
     return render_template('change_password.html')
 
 if __name__ == '__main__':
+    start_scoring_workers()
+    start_purge_worker()
     app.run(debug=True)
@@ -0,0 +1,308 @@
+# benchmark.py
+# Load-test the main routes against the current database and report latency
+# percentiles and throughput as JSON, so runs can be compared between commits.
+#
+#   python generate_data.py --reset                      # synthetic data first
+#   python benchmark.py -o before.json                   # Flask test client
+#   python benchmark.py --server --concurrency 8 -o after.json   # real HTTP via waitress
+#   python benchmark.py --compare before.json            # print the change per route
+#
+# /rate and /submit_article write to the database, so benchmark a copy made by
+# generate_data.py (UNFAKE_DB_PATH=bench.db) rather than real data.
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from app import app
+from db import get_connection, register_user
+from generate_data import GENERATED_PASSWORD, WORDS
+
+ROUTES = ('dashboard', 'search', 'article', 'rate', 'submit_article', 'top_raters', 'low_credibility')
+
+
+class Workload:
+    """Builds a random but reproducible request for each route."""
+
+    def __init__(self, seed):
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT MIN(article_id), MAX(article_id) FROM articles")
+            self.min_id, self.max_id = cur.fetchone()
+            cur.execute("SELECT category_id FROM categories ORDER BY category_id")
+            self.category_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM articles), "
+                        "(SELECT COUNT(*) FROM ratings)")
+            self.counts = dict(zip(('users', 'articles', 'ratings'), cur.fetchone()))
+        finally:
+            conn.close()
+        if self.max_id is None:
+            sys.exit("The database has no articles; run generate_data.py first.")
+        self.seed = seed
+
+    def request(self, route, rng):
+        """(method, path, form data) for one request to route."""
+        if route == 'dashboard':
+            return 'GET', '/dashboard', None
+        if route == 'search':
+            return 'GET', '/search?' + urllib.parse.urlencode({'q': rng.choice(WORDS)}), None
+        if route == 'article':
+            return 'GET', f'/article/{rng.randint(self.min_id, self.max_id)}', None
+        if route == 'rate':
+            return 'POST', '/rate', {'article_id': rng.randint(self.min_id, self.max_id),
+                                     'rating_value': rng.randint(1, 5), 'comment': 'benchmark'}
+        if route == 'submit_article':
+            return 'POST', '/submit_article', {
+                'title': 'Benchmark ' + ' '.join(rng.choice(WORDS) for _ in range(6)),
+                'contents': ' '.join(rng.choice(WORDS) for _ in range(200)),
+                'author_name': 'Benchmark',
+                'source_link': 'https://example.com/benchmark',
+                'categories': rng.choice(self.category_ids),
+            }
+        return 'GET', '/' + route, None
+
+
+class TestClientSession:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def send(self, method, path, data=None):
+        if method == 'POST':
+            return self.client.post(path, data=data).status_code
+        return self.client.get(path).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()),
+                                                  _NoRedirect)
+
+    def send(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base_url + path, data=body, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            # redirects come back as HTTPError because they are not followed
+            e.read()
+            return e.code
+
+
+# Run by start_server in a child process, which is simply terminated afterwards
+SERVER_SCRIPT = """
+import logging, sys
+from waitress import serve
+from app import app
+# waitress warns on every queued request once all threads are busy, which is the point here
+logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+serve(app, host='127.0.0.1', port=int(sys.argv[1]), threads=int(sys.argv[2]))
+"""
+SERVER_START_TIMEOUT = 30
+
+def start_server(threads):
+    """Serve the app with waitress in a child process. Returns (process, base_url)."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT, str(port), str(threads)],
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                stop_server(process)
+                raise RuntimeError("the benchmark server did not start")
+            time.sleep(0.1)
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def benchmark_users(count):
+    """Usernames to log in as, one per concurrent client."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT username FROM users WHERE password = ? ORDER BY user_id LIMIT ?",
+                    (GENERATED_PASSWORD, count))
+        usernames = [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+    for i in range(len(usernames), count):
+        username = f"bench{i}"
+        register_user(username, GENERATED_PASSWORD, f"{username}@example.com")
+        usernames.append(username)
+    return usernames
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    # nearest-rank percentile
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def run_route(route, sessions, workload, requests, warmup):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    per_session = [requests // len(sessions) + (1 if i < requests % len(sessions) else 0)
+                   for i in range(len(sessions))]
+
+    def worker(index, session, count):
+        rng = random.Random(f"{workload.seed}-{route}-{index}")
+        for _ in range(warmup):
+            session.send(*workload.request(route, rng))
+        barrier.wait()
+        mine = []
+        failed = 0
+        for _ in range(count):
+            method, path, data = workload.request(route, rng)
+            started = time.perf_counter()
+            try:
+                status = session.send(method, path, data)
+            except Exception:
+                status = 0
+            mine.append(time.perf_counter() - started)
+            if status == 0 or status >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    barrier = threading.Barrier(len(sessions) + 1)
+    threads = [threading.Thread(target=worker, args=(i, s, n)) for i, (s, n) in enumerate(zip(sessions, per_session))]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        'max_ms': ms(latencies[-1]) if latencies else 0.0,
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(routes, requests, concurrency, warmup, server, seed):
+    workload = Workload(seed)
+    if server:
+        httpd, base_url = start_server(concurrency)
+        sessions = [HttpSession(base_url) for _ in range(concurrency)]
+    else:
+        httpd = None
+        sessions = [TestClientSession() for _ in range(concurrency)]
+    for session, username in zip(sessions, benchmark_users(concurrency)):
+        session.send('POST', '/login', {'username': username, 'password': GENERATED_PASSWORD})
+
+    results = {}
+    try:
+        for route in routes:
+            results[route] = run_route(route, sessions, workload, requests, warmup)
+            r = results[route]
+            print(f"{route:16} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+                  f"p99 {r['p99_ms']:8.2f} ms  {r['requests_per_second']:8.1f} req/s"
+                  + (f"  {r['errors']} errors" if r['errors'] else ""), file=sys.stderr)
+    finally:
+        if httpd:
+            stop_server(httpd)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'driver': 'waitress' if server else 'test_client',
+            'concurrency': concurrency,
+            'requests_per_route': requests,
+            'warmup_per_client': warmup,
+            'seed': seed,
+            'dataset': workload.counts,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'routes': results,
+    }
+
+def compare(baseline, current):
+    print(f"{'route':16} {'p50 ms':>20} {'p95 ms':>20} {'req/s':>20}")
+    for route, now in current['routes'].items():
+        before = baseline['routes'].get(route)
+        if not before:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'requests_per_second'):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:.1f} -> {now[key]:.1f} ({change:+.0f}%)")
+        print(f"{route:16} " + " ".join(f"{cell:>20}" for cell in cells))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the main routes and report JSON results.")
+    parser.add_argument('--routes', default=','.join(ROUTES),
+                        help=f"comma-separated routes (default all: {','.join(ROUTES)})")
+    parser.add_argument('--requests', type=int, default=200, help="measured requests per route (default 200)")
+    parser.add_argument('--concurrency', type=int, default=1, help="concurrent clients (default 1)")
+    parser.add_argument('--warmup', type=int, default=5, help="unmeasured requests per client and route (default 5)")
+    parser.add_argument('--server', action='store_true',
+                        help="serve the app with waitress and send real HTTP requests")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', help="write the JSON results here (default stdout)")
+    parser.add_argument('--compare', metavar='BASELINE', help="results file to compare this run against")
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    results = run(routes, args.requests, max(1, args.concurrency), args.warmup, args.server, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
@@ -0,0 +1,189 @@
+# bulk_import.py
+# Streaming bulk import of articles from JSONL or CSV.
+#
+# Records are parsed one at a time, validated, scored in vectorized batches
+# and inserted with executemany, one transaction per batch. Bad records are
+# passed to an on_reject callback instead of stopping the import.
+#
+# Fields per record: title, contents (required), author_name, source_link,
+# publication_date (YYYY-MM-DD) and categories (category names; a list in
+# JSONL, separated by ';' in CSV).
+import csv
+import io
+import json
+import time
+from datetime import date
+
+from db import encode_body, get_categories, make_excerpt, run_write
+from ml import score_texts
+from response_cache import invalidate as invalidate_pages
+
+FORMATS = ('jsonl', 'csv')
+IMPORT_BATCH_SIZE = 2000
+MAX_TITLE_LENGTH = 500
+
+
+class RejectedRecord(ValueError):
+    pass
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return None
+
+def iter_records(text_stream, fmt):
+    """Yield (line_number, record_or_exception) without reading the whole stream."""
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(text_stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise RejectedRecord("expected a JSON object")
+                yield line_number, record
+            except ValueError as e:
+                yield line_number, RejectedRecord(f"invalid JSON: {e}")
+    elif fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, RejectedRecord("more values than header columns")
+                continue
+            yield reader.line_num, record
+    else:
+        raise ValueError(f"unsupported import format: {fmt}")
+
+def _text(record, field, required=False):
+    value = record.get(field)
+    if value is None:
+        value = ''
+    if not isinstance(value, str):
+        value = str(value)
+    value = value.strip()
+    if required and not value:
+        raise RejectedRecord(f"missing {field}")
+    return value
+
+def prepare_record(record, category_ids, default_author):
+    """Validate one record. Returns (article values, category ids) or raises RejectedRecord."""
+    title = _text(record, 'title', required=True)
+    if len(title) > MAX_TITLE_LENGTH:
+        raise RejectedRecord("title too long")
+    contents = _text(record, 'contents', required=True)
+    author_name = _text(record, 'author_name') or default_author
+    source_link = _text(record, 'source_link')
+
+    publication_date = _text(record, 'publication_date')
+    if publication_date:
+        try:
+            publication_date = date.fromisoformat(publication_date[:10]).isoformat()
+        except ValueError:
+            raise RejectedRecord(f"invalid publication_date {publication_date!r}")
+    else:
+        publication_date = date.today().isoformat()
+
+    names = record.get('categories') or []
+    if isinstance(names, str):
+        names = names.split(';')
+    ids = []
+    for name in names:
+        name = str(name).strip()
+        if not name:
+            continue
+        category_id = category_ids.get(name.lower())
+        if category_id is None:
+            raise RejectedRecord(f"unknown category {name!r}")
+        if category_id not in ids:
+            ids.append(category_id)
+
+    return (title, contents, author_name, source_link, publication_date), ids
+
+def _insert_batch(batch, submitter_id):
+    """Score and insert one batch of prepared records in a single transaction."""
+    try:
+        scores = score_texts([values[1] for values, _ in batch])
+        status, queued_at = 'scored', None
+    except Exception as e:
+        print(f"Error scoring import batch, leaving it for the scoring queue: {e}")
+        scores = [0] * len(batch)
+        status, queued_at = 'pending', time.time()
+
+    def write(conn):
+        cur = conn.cursor()
+        # IMMEDIATE: nobody else can insert articles until we commit, so the
+        # AUTOINCREMENT ids handed out to this batch are consecutive
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'articles'")
+        row = cur.fetchone()
+        first_id = (row[0] if row else 0) + 1
+
+        cur.executemany("""
+            INSERT INTO articles (title, excerpt, author_name, source_link, publication_date,
+                                  submitter_id, ml_score, ml_status, ml_queued_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(title, make_excerpt(contents), *rest, submitter_id, score, status, queued_at)
+              for ((title, contents, *rest), _), score in zip(batch, scores)])
+
+        cur.executemany("""
+            INSERT INTO article_bodies (article_id, body, compression)
+            VALUES (?, ?, ?)
+        """, [(first_id + offset, *encode_body(values[1]))
+              for offset, (values, _) in enumerate(batch)])
+
+        cur.executemany("""
+            INSERT INTO article_category (article_id, category_id)
+            VALUES (?, ?)
+        """, [(first_id + offset, category_id)
+              for offset, (_, category_ids) in enumerate(batch)
+              for category_id in category_ids])
+        return first_id
+
+    first_id = run_write(write)
+    invalidate_pages("articles", *(f"article:{first_id + offset}" for offset in range(len(batch))))
+    return status == 'pending'
+
+def import_articles(text_stream, fmt, submitter_id, default_author='', on_reject=None,
+                    batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import every record from text_stream. on_reject(line_number, error, record)
+    is called for each record that can't be imported. Returns a stats dict.
+    """
+    category_ids = {row['category_name'].lower(): row['category_id'] for row in get_categories()}
+    stats = {'read': 0, 'imported': 0, 'rejected': 0, 'pending_scoring': 0}
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        if batch:
+            if _insert_batch(batch, submitter_id):
+                stats['pending_scoring'] += len(batch)
+            stats['imported'] += len(batch)
+            batch.clear()
+
+    for line_number, record in iter_records(text_stream, fmt):
+        stats['read'] += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append(prepare_record(record, category_ids, default_author))
+        except RejectedRecord as e:
+            stats['rejected'] += 1
+            if on_reject:
+                on_reject(line_number, str(e), None if isinstance(record, Exception) else record)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_second'] = stats['imported'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    return stats
+
+def open_text(binary_stream):
+    """Decode an uploaded/opened binary stream lazily as UTF-8 text."""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
@@ -0,0 +1,170 @@
+# cache.py
+# Small thread-safe in-process caches shared by the data layer and the app.
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry when full."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TaggedCache:
+    """
+    LRU cache whose entries also expire after ttl seconds and carry tags.
+    invalidate(tag) drops every entry with that tag and bumps the tag's
+    version; put() with the versions read before computing the value skips
+    storing it if one of its tags was invalidated in the meantime.
+    """
+
+    def __init__(self, maxsize=512, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, tags, expires)
+        self._keys_by_tag = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def versions(self, tags):
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def put(self, key, value, tags=(), versions=None):
+        with self._lock:
+            if versions is not None and versions != tuple(self._versions.get(tag, 0) for tag in tags):
+                return False
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, tuple(tags), time.monotonic() + self.ttl)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+            return True
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for tag in list(self._keys_by_tag):
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+            self._data.clear()
+            self._keys_by_tag.clear()
+
+    def _remove(self, key):
+        _, tags, _ = self._data.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GenerationCache:
+    """
+    A single value (a small table read whole) kept until its generation
+    number changes. read_generation() returns the current number, cheaply;
+    load() returns (generation, value). get() checks the generation at most
+    every check_interval seconds and reloads only when it has moved on, so a
+    change made by another process shows up within check_interval.
+    invalidate() makes the next get() check at once.
+    """
+
+    def __init__(self, load, read_generation, check_interval=1.0):
+        self._load = load
+        self._read_generation = read_generation
+        self.check_interval = check_interval
+        self._value = None
+        self._generation = None
+        self._next_check = 0.0
+        self._invalidations = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.reloads = 0
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not None and now < self._next_check:
+                self.hits += 1
+                return self._value
+            current = self._generation
+            invalidations = self._invalidations
+        reload = current is None or self._read_generation() != current
+        if reload:
+            generation, value = self._load()
+        with self._lock:
+            if reload:
+                self._value, self._generation = value, generation
+                self.reloads += 1
+            else:
+                self.hits += 1
+            # A value loaded while invalidate() ran may predate the change; check again next time
+            if invalidations == self._invalidations:
+                self._next_check = now + self.check_interval
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation = None
+            self._next_check = 0.0
+            self._invalidations += 1
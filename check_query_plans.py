@@ -0,0 +1,190 @@
+# check_query_plans.py
+# Query-plan regression check: runs the data layer and every page against a
+# throwaway database, records each SELECT that reaches SQLite and fails if
+# EXPLAIN QUERY PLAN shows a full table scan instead of an index.
+#
+#   python check_query_plans.py            # exit status 1 on regressions
+#   python check_query_plans.py --verbose  # also print every plan
+#
+# tests/test_query_plans.py runs the same check as part of the test suite.
+import os
+import sqlite3
+import sys
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix='unfake-plans-')
+os.environ['UNFAKE_DB_PATH'] = os.path.join(_tmpdir, 'plans.db')
+os.environ.setdefault('UNFAKE_SCORING_WORKERS', '0')
+
+import db
+import search
+from schema_creation import create_schema
+
+# Small lookup tables that are read whole on purpose
+ALLOWED_FULL_SCANS = {'categories', 'c'}
+
+# Statements (or the start of them) that read a whole table by design, with the reason
+KNOWN_FULL_SCANS = {
+    "SELECT a.article_id, a.title, article_body(b.body, b.compression) AS contents,":
+        "export streams the whole corpus",
+    "SELECT r.rating_id, r.article_id, r.user_id, ru.username, r.rating_value,":
+        "export streams every rating",
+    "WITH matched AS MATERIALIZED ( SELECT a.article_id, a.overall_rating, a.is_fake, a.ml_status, a.ml_score FROM articles a WHERE a.deleted_at IS NULL )":
+        "facet counts of an unfiltered search cover every article (and are cached)",
+}
+
+_statements = []
+
+def _record(statement):
+    # Trigger bodies are reported as "-- TRIGGER name"; writes are not checked,
+    # nor are FTS5's own lookups in its shadow tables
+    if "'main'." in statement:
+        return
+    if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        _statements.append(statement)
+
+def seed():
+    for i in range(20):
+        db.register_user(f'user{i}', 'pw', f'user{i}@example.com')
+    categories = [row['category_id'] for row in db.get_categories()]
+    for i in range(60):
+        article_id = db.create_article(f'Article {i} about elections', f'Body text {i} with money and pills',
+                                       f'Author {i % 7}', '', 1 + i % 20, categories[:1 + i % 3])
+        for user_id in range(1, 1 + i % 5):
+            db.rate_article(user_id, article_id, 1 + (i + user_id) % 5, 'comment')
+
+def exercise():
+    """Call every read path the app has: data-layer helpers and all pages."""
+    from app import app
+
+    db.get_user_id('user1')
+    db.check_user_credentials('user1', 'pw')
+    articles, cursor = db.get_dashboard_page(limit=10)
+    db.get_dashboard_page(cursor[0], cursor[1], limit=10)
+    db.get_comments_for_articles([a['article_id'] for a in articles])
+    db.get_top_3_users()
+    db.get_low_credibility_articles()
+    db.get_categories()
+    db.search_articles_db()
+    db.search_articles_db(category='Politics')
+    db.search_articles_db(min_rating=3)
+    db.search_articles_db(publication_date='2024-01-01')
+    db.search_articles_db(username='user1')
+    db.search_articles_db(q='elect*')
+    db.search_articles_db(category=['Politics', 'Science'], limit=5)
+    db.search_articles_db(category=['Politics', 'Science'], category_match='all', limit=5)
+    db.search_articles_db(date_from='2024-01-01', date_to='2024-12-31', limit=5)
+    db.search_articles_db(is_fake=1, limit=5)
+    db.search_articles_db(min_ml_score=0.2, max_ml_score=0.6, limit=5)
+    db.search_articles_db(username='user1', limit=5)
+    for sort in search.SORTS:
+        rows = db.search_articles_db(sort=sort, q='elect*' if sort == 'relevance' else None, limit=5)
+        db.search_articles_db(sort=sort, q='elect*' if sort == 'relevance' else None, limit=5,
+                              after=search.sort_key(sort, rows[-1]) if rows else (0, 0))
+    db.search_articles_db(sort='rating', min_rating=3, limit=5)
+    db.search_articles_db(sort='oldest', date_from='2024-01-01', is_fake=0, limit=5)
+    db.search_articles_db(sort='ml_score', min_ml_score=0.5, limit=5)
+    db.search_articles_db(sort='newest', q='money', category=['Politics'], limit=5)
+    db.search_articles_db(sort='newest', title='elect*', is_fake=0, limit=5)
+    db.search_articles_db(sort='newest', username='user1', min_ml_score=0.5, limit=5)
+    db.get_search_facets()
+    db.get_search_facets(q='elect*')
+    db.get_search_facets(category=['Politics'], date_from='2024-01-01', is_fake=0)
+    db.get_admin_users(limit=5)
+    db.get_admin_users('user1', after='user1', limit=5)
+    db.get_pending_articles(10)
+    db.get_scoring_backlog()
+    db.get_job_checkpoint('rescore_articles')
+    next(db.iter_article_texts(0, 10))
+    list(db.iter_export_articles(category='Politics'))
+    list(db.iter_export_articles(category=['Politics', 'Science'], date_from='2024-01-01', is_fake=1))
+    list(db.iter_export_articles(q='elect*'))
+    list(db.iter_export_ratings(min_rating=3))
+    list(db.iter_export_ratings(q='money'))
+
+    client = app.test_client()
+    for path in ['/', '/search', '/search?q=money', '/search?category=Politics&sort=ml_score', '/top_raters', '/low_credibility',
+                 '/article/1', '/user/2', '/api/v1/articles/1', '/api/v1/users/2/ratings?limit=2',
+                 '/api/v1/low_credibility?limit=2', '/api/v1/search?q=money&limit=2',
+                 '/api/v1/search?category=Politics&limit=2',
+                 '/api/v1/search?category=Politics,Science&category_match=all&sort=rating&limit=2',
+                 '/api/v1/search?date_from=2024-01-01&is_fake=0&sort=oldest&limit=2',
+                 '/api/v1/search?q=money&facets=1&limit=2']:
+        response = client.get(path)
+        cursor = response.is_json and response.json.get('next_cursor')
+        if cursor:
+            client.get(path + '&cursor=' + cursor)
+    client.post('/login', data={'username': 'admin_user', 'password': 'admin123'})
+    for path in ['/dashboard', '/submit_article', '/my_profile', '/admin', '/edit_profile/2',
+                 '/admin?title=elections&is_fake=0&user_prefix=user1', '/admin?username=user1&max_ml_score=0.9',
+                 '/admin/export/articles?format=csv', '/admin/export/ratings?gzip=1']:
+        client.get(path)
+    client.post('/admin', data={'action': 'mark_fake', 'article_id': [3, 4]})
+    client.post('/admin', data={'action': 'delete', 'article_id': [5, 6]})
+    client.post('/admin', data={'remove_user_id': 3})
+    client.get('/admin/purge_queue')
+    db.purge_removed()
+    db.repair_orphans()
+    client.post('/rate', data={'article_id': 2, 'rating_value': 4, 'comment': 'ok'})
+
+def full_scans(plan_rows):
+    problems = []
+    # Subqueries/CTEs materialized by the plan are scanned by name; that's fine
+    subqueries = {row[3].split()[-1] for row in plan_rows
+                  if row[3].startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+    for row in plan_rows:
+        detail = row[3]
+        if not detail.startswith('SCAN '):
+            continue
+        name = detail.split()[1]
+        if 'INDEX' in detail or 'VIRTUAL TABLE' in detail or detail == 'SCAN CONSTANT ROW':
+            continue
+        if name in ALLOWED_FULL_SCANS or name in subqueries:
+            continue
+        problems.append(detail)
+    return problems
+
+def collect_plans():
+    """
+    Build the throwaway database, run exercise() against it and return
+    (statement, plan rows, full scans) for every distinct SELECT it recorded.
+    Statements in KNOWN_FULL_SCANS report no full scans.
+    """
+    create_schema()
+    seed()
+    db.CONNECTION_HOOKS.append(lambda conn: conn.set_trace_callback(_record))
+    db.get_pool().close_all()
+    db.get_writer().close()
+    exercise()
+
+    conn = sqlite3.connect(db.DB_PATH)
+    db.register_sql_functions(conn)
+    plans = []
+    for statement in dict.fromkeys(_statements):
+        plan = conn.execute("EXPLAIN QUERY PLAN " + statement).fetchall()
+        normalized = " ".join(statement.split())
+        known = any(normalized.startswith(prefix) for prefix in KNOWN_FULL_SCANS)
+        plans.append((normalized, plan, full_scans(plan) if not known else []))
+    conn.close()
+    return plans
+
+def main(verbose=False):
+    plans = collect_plans()
+    failures = 0
+    for statement, plan, problems in plans:
+        if problems or verbose:
+            print(statement)
+            for row in plan:
+                print("    " + row[3])
+            print()
+        if problems:
+            failures += 1
+
+    if failures:
+        print(f"FAILED: {failures} of {len(plans)} queries do a full table scan")
+        return 1
+    print(f"OK: {len(plans)} queries checked, all use indexes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(verbose='--verbose' in sys.argv))
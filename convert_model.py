@@ -0,0 +1,41 @@
+# convert_model.py
+# Convert the pickled sklearn pipeline into the memory-mapped model directory
+# that ml.py loads at startup, and check that both give the same scores.
+import argparse
+import pickle
+
+import numpy as np
+
+from ml import MODEL_PATH, MODEL_DIR, MappedModel, export_model_arrays
+
+# Extra texts to compare on, besides the vocabulary terms themselves
+SAMPLE_TEXTS = [
+    "",
+    "Breaking news about economy stocks soared",
+    "Click here for cheap pills guaranteed miracle",
+    "WIN BIG money with one weird trick!!! Ünïcödé tëxt",
+    "Local election updates show new policies and technology advances",
+]
+
+def convert_model(pickle_path=MODEL_PATH, output_dir=MODEL_DIR):
+    with open(pickle_path, "rb") as f:
+        pipeline = pickle.load(f)
+    export_model_arrays(pipeline, output_dir, source_path=pickle_path)
+
+    mapped = MappedModel(output_dir)
+    texts = SAMPLE_TEXTS + [term for term in pipeline.steps[0][1].vocabulary_]
+    expected = pipeline.predict_proba(texts)
+    actual = mapped.predict_proba(texts)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    if list(mapped.classes_) != list(pipeline.classes_) or not np.allclose(expected, actual, rtol=0, atol=1e-12):
+        raise SystemExit(f"Converted model disagrees with {pickle_path} (max difference {max_diff})")
+
+    print(f"Model exported to {output_dir}: {len(mapped.vocabulary)} terms, "
+          f"max score difference {max_diff:.1e} over {len(texts)} texts")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the pickled ML model as memory-mappable arrays.")
+    parser.add_argument('--pickle', default=MODEL_PATH, help=f"pickled pipeline (default {MODEL_PATH})")
+    parser.add_argument('--output', default=MODEL_DIR, help=f"model directory to write (default {MODEL_DIR})")
+    args = parser.parse_args()
+    convert_model(args.pickle, args.output)
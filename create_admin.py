@@ -11,15 +11,15 @@ def create_admin_user():
         cur = conn.cursor()
         
         # Check if admin user already exists
-        cur.execute("SELECT id FROM users WHERE username = 'admin_user'")
+        cur.execute("SELECT user_id FROM users WHERE username = 'admin_user'")
         if cur.fetchone():
             print("Admin user already exists!")
             return
         
         # Create admin user
         cur.execute("""
-            INSERT INTO users (username, password, email)
-            VALUES (?, ?, ?)
+            INSERT INTO users (username, password, email, role)
+            VALUES (?, ?, ?, 'admin')
         """, ('admin_user', 'admin123', 'admin@unfake.com'))
         
         conn.commit()
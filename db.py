@@ -1,143 +1,747 @@
 # db.py
 import sqlite3
 import os
+import random
+import threading
 import time
+import zlib
+from collections import deque
 from datetime import datetime
 
+from flask import current_app, g, has_app_context
+
+from cache import GenerationCache, LRUCache
+from metrics import InstrumentedConnection, record_checkout, record_connect
+from response_cache import clear as clear_page_cache, data_cache, invalidate as invalidate_pages
+from search import facet_sql, filter_sql, group_facets, match_expression, search_sql, where_sql
+from writer import DatabaseWriter, WriteBatcher
+
 # For ML
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import Pipeline
-import pickle
+from ml import load_or_train_ml_model, ml_analyze_article
 
-_model_pipeline = None
+# ============ CONNECTION POOL ============
 
-def get_connection():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(current_dir, 'unfake.db')
-    
-    # Add retry logic for database connections
-    max_retries = 3
-    retry_delay = 1  # seconds
-    
-    for attempt in range(max_retries):
+DB_PATH = os.environ.get(
+    'UNFAKE_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'unfake.db')
+)
+
+# Maximum number of connections open at once (idle + checked out)
+POOL_SIZE = int(os.environ.get('UNFAKE_DB_POOL_SIZE', '8'))
+# How long a caller waits for a free connection before giving up (seconds)
+POOL_TIMEOUT = float(os.environ.get('UNFAKE_DB_POOL_TIMEOUT', '10'))
+# SQLite busy timeout for each connection (seconds)
+BUSY_TIMEOUT = float(os.environ.get('UNFAKE_DB_BUSY_TIMEOUT', '20'))
+# Idle connections older than this are pinged before being handed out (seconds)
+HEALTH_CHECK_INTERVAL = float(os.environ.get('UNFAKE_DB_HEALTH_CHECK_INTERVAL', '30'))
+
+# Extra callables run on every new connection, e.g. to install a trace hook
+CONNECTION_HOOKS = []
+
+# Memory-mapped I/O per connection; reads served from the mapping skip a copy
+MMAP_SIZE = int(os.environ.get('UNFAKE_DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+# Applied once, when a connection is created
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",     # 16 MB page cache
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Pooled connections only read: under WAL they all run at once, and every
+# write goes through the writer thread (run_write) instead
+READ_ONLY_PRAGMAS = (
+    "PRAGMA query_only=ON",
+)
+
+# Backoff when opening a connection fails with "database is locked"
+CONNECT_RETRIES = 5
+CONNECT_BACKOFF_BASE = 0.05  # seconds, doubled on every attempt
+CONNECT_BACKOFF_MAX = 1.0
+
+
+class PooledConnection:
+    """
+    A checked-out pool connection. Behaves like sqlite3.Connection, except that
+    close() hands the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        # Request-scoped connections are returned by the app context teardown
+        if self._request_scoped or self._released:
+            return
+        self._released = True
+        self._pool.release(self._conn)
+
+
+class ConnectionPool:
+    """Bounded pool of read-only SQLite connections shared by all threads of a process."""
+
+    def __init__(self, db_path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = deque()  # (connection, time it was returned)
+        self._open = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'checkout_waits': 0,
+            'checkout_wait_seconds': 0.0,
+            'connect_retries': 0,
+            'connect_wait_seconds': 0.0,
+            'health_check_failures': 0,
+        }
+
+    def _connect(self, read_only=True):
+        attempt = 0
+        while True:
+            try:
+                started = time.perf_counter()
+                # Instrumented: every statement's time goes into the SQL metrics
+                conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT,
+                                       check_same_thread=False, factory=InstrumentedConnection)
+                try:
+                    conn.row_factory = sqlite3.Row
+                    for pragma in CONNECTION_PRAGMAS:
+                        conn.execute(pragma)
+                    if read_only:
+                        for pragma in READ_ONLY_PRAGMAS:
+                            conn.execute(pragma)
+                    register_sql_functions(conn)
+                    for hook in CONNECTION_HOOKS:
+                        hook(conn)
+                except Exception:
+                    conn.close()
+                    raise
+                self.stats['connections_opened'] += 1
+                record_connect(time.perf_counter() - started)
+                return conn
+            except sqlite3.OperationalError:
+                attempt += 1
+                if attempt >= CONNECT_RETRIES:
+                    raise
+                # Exponential backoff with jitter so waiting threads don't retry in lockstep
+                delay = min(CONNECT_BACKOFF_BASE * (2 ** (attempt - 1)), CONNECT_BACKOFF_MAX)
+                delay *= random.uniform(0.5, 1.0)
+                self.stats['connect_retries'] += 1
+                self.stats['connect_wait_seconds'] += delay
+                time.sleep(delay)
+
+    def _is_healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            self.stats['health_check_failures'] += 1
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self.stats['connections_closed'] += 1
+            self._cond.notify()
+
+    def acquire(self):
+        """Check a raw connection out of the pool, opening one if allowed."""
+        deadline = time.monotonic() + self.timeout
+        waited_from = None
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError(
+                        f"timed out waiting for a database connection (pool size {self.size})")
+                if waited_from is None:
+                    waited_from = time.monotonic()
+                    self.stats['checkout_waits'] += 1
+                self._cond.wait(remaining)
+            if waited_from is not None:
+                self.stats['checkout_wait_seconds'] += time.monotonic() - waited_from
+            self.stats['checkouts'] += 1
+            if self._idle:
+                conn, idle_since = self._idle.pop()
+            else:
+                conn, idle_since = None, None
+                self._open += 1
+
+        if conn is not None:
+            if self._is_healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+            with self._cond:
+                self._open += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back anything left uncommitted."""
         try:
-            conn = sqlite3.connect(db_path, timeout=20)  # Increased timeout
-            conn.row_factory = sqlite3.Row
-            # Enable WAL mode for better concurrency
-            conn.execute("PRAGMA journal_mode=WAL")
-            return conn
-        except sqlite3.OperationalError as e:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                continue
-            raise e
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update(size=self.size, open=self._open, idle=len(self._idle),
+                         in_use=self._open - len(self._idle))
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+def get_connection():
+    """
+    Check a connection out of the pool. Callers must close() it to return it.
+    Inside a Flask app context all helpers share one connection, which is
+    returned to the pool when the app context is torn down.
+    """
+    pool = get_pool()
+    if has_app_context() and 'unfake_db' in current_app.extensions:
+        if 'db_conn' not in g:
+            started = time.perf_counter()
+            g.db_conn = pool.acquire()
+            record_checkout(time.perf_counter() - started)
+        return PooledConnection(pool, g.db_conn, request_scoped=True)
+    return PooledConnection(pool, pool.acquire())
+
+def release_request_connection(exception=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+def init_app(app):
+    """Make get_connection() hand out one pooled connection per app context."""
+    app.extensions['unfake_db'] = get_pool()
+    app.teardown_appcontext(release_request_connection)
+
+def get_pool_stats():
+    return get_pool().get_stats()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """The writer thread that owns this process's read-write connection."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = DatabaseWriter(lambda: get_pool()._connect(read_only=False))
+    return _writer
+
+def run_write(write, *args, **kwargs):
+    """
+    Run write(conn, *args, **kwargs) on the writer thread, in its own
+    transaction, and return its result. write must do all its reads and
+    writes through conn; it is committed if it returns, rolled back if it raises.
+    """
+    return get_writer().run(write, *args, **kwargs)
+
+def get_writer_stats():
+    return get_writer().get_stats()
+
+# ============ ARTICLE BODIES ============
+
+# Article bodies live in article_bodies, apart from the summary columns list
+# pages read, and are compressed unless compression wouldn't save anything.
+# 'none' stores new bodies as plain text; rows already written keep theirs.
+BODY_COMPRESSION = os.environ.get('UNFAKE_BODY_COMPRESSION', 'zlib')
+BODY_COMPRESSION_MIN_BYTES = 256
+EXCERPT_CHARS = 240
+
+if BODY_COMPRESSION not in ('zlib', 'none'):
+    raise ValueError(f"UNFAKE_BODY_COMPRESSION must be 'zlib' or 'none', not {BODY_COMPRESSION!r}")
+
+def encode_body(text):
+    """(body, compression) to store for an article's text."""
+    text = text or ""
+    raw = text.encode('utf-8')
+    if BODY_COMPRESSION == 'zlib' and len(raw) >= BODY_COMPRESSION_MIN_BYTES:
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) < len(raw):
+            return compressed, 'zlib'
+    return text, 'none'
+
+def decode_body(body, compression):
+    """The text stored by encode_body(); registered in SQL as article_body(body, compression)."""
+    if body is None:
+        return None
+    if compression == 'zlib':
+        return zlib.decompress(body).decode('utf-8')
+    if compression == 'none':
+        return body if isinstance(body, str) else bytes(body).decode('utf-8')
+    raise ValueError(f"unknown article body compression {compression!r}")
+
+def make_excerpt(text):
+    """Plain-text start of an article for list pages, cut at a word boundary."""
+    text = " ".join((text or "").split())
+    if len(text) <= EXCERPT_CHARS:
+        return text
+    cut = text.rfind(" ", 0, EXCERPT_CHARS)
+    return text[:cut if cut > 0 else EXCERPT_CHARS].rstrip(" ,.;:") + "…"
+
+def register_sql_functions(conn):
+    """
+    Functions the schema relies on: the search index reads bodies through
+    article_body(), so every connection that writes articles or searches
+    needs them (pooled connections get them automatically).
+    """
+    conn.create_function('article_body', 2, decode_body, deterministic=True)
 
 def check_user_credentials(username, password):
+    """Return the user's row (user_id, username, role) if the password matches, else None."""
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT password FROM users WHERE username=?", (username,))
+        cur.execute("""
+            SELECT user_id, username, password, role FROM users
+            WHERE username=? AND deleted_at IS NULL
+        """, (username,))
         result = cur.fetchone()
-        return result and result['password'] == password
+        if result and result['password'] == password:
+            _user_identity_cache.put(username, (result['user_id'], result['role']))
+            return result
+        return None
     finally:
         conn.close()
 
-def get_user_id(username):
+def check_user_password(user_id, password):
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT user_id FROM users WHERE username=?", (username,))
+        cur.execute("SELECT password FROM users WHERE user_id=? AND deleted_at IS NULL", (user_id,))
         result = cur.fetchone()
-        return result['user_id'] if result else None
+        return bool(result) and result['password'] == password
     finally:
         conn.close()
 
-def register_user(username, password, email):
+# username -> (user_id, role) for sessions that don't carry them yet.
+# Entries must be dropped with forget_user() whenever a user is removed.
+USER_CACHE_SIZE = int(os.environ.get('UNFAKE_USER_CACHE_SIZE', '4096'))
+_user_identity_cache = LRUCache(USER_CACHE_SIZE)
+
+def get_user_identity(username):
+    """Return (user_id, role) for a username, or None if there is no such user (or it was removed)."""
+    identity = _user_identity_cache.get(username)
+    if identity is not None:
+        return identity
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("""
+        cur.execute("SELECT user_id, role FROM users WHERE username=? AND deleted_at IS NULL", (username,))
+        result = cur.fetchone()
+    finally:
+        conn.close()
+    if not result:
+        return None
+    identity = (result['user_id'], result['role'])
+    _user_identity_cache.put(username, identity)
+    return identity
+
+def get_user_id(username):
+    identity = get_user_identity(username)
+    return identity[0] if identity else None
+
+def forget_user(username=None):
+    """Invalidate cached identities: one username, or all of them."""
+    if username is None:
+        _user_identity_cache.clear()
+    else:
+        _user_identity_cache.pop(username)
+
+def get_user_cache_stats():
+    return {'size': len(_user_identity_cache), 'hits': _user_identity_cache.hits,
+            'misses': _user_identity_cache.misses}
+
+def register_user(username, password, email):
+    def write(conn):
+        conn.execute("""
             INSERT INTO users (username, password, email)
             VALUES (?, ?, ?)
         """, (username, password, email))
-        conn.commit()
+    try:
+        run_write(write)
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def get_all_articles():
     conn = get_connection()
     try:
         cur = conn.cursor()
         cur.execute("""
-            SELECT a.article_id, a.title, a.contents, a.author_name,
+            SELECT a.article_id, a.title, a.excerpt, a.author_name,
                    a.publication_date, a.overall_rating, a.is_fake,
                    a.submitter_id, u.username as submitter_name,
-                   a.ml_score, a.source_link
+                   a.ml_score, a.ml_status, a.source_link
             FROM articles a
             LEFT JOIN users u ON a.submitter_id = u.user_id
+            WHERE a.deleted_at IS NULL
             ORDER BY a.publication_date DESC
         """)
         return cur.fetchall()
     finally:
         conn.close()
 
-def mark_article_as_fake(article_id, is_fake):
+def get_dashboard_page(before_date=None, before_id=None, limit=20):
+    """
+    Return one page of articles for the dashboard, newest first.
+    Uses keyset pagination on (publication_date, article_id): pass the values
+    of the last row of the previous page to get the next one.
+    Returns (articles, next_cursor) where next_cursor is None on the last page.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        query = """
+            SELECT a.article_id, a.title, a.excerpt, a.author_name,
+                   a.publication_date, a.overall_rating, a.is_fake,
+                   a.submitter_id, u.username as submitter_name,
+                   a.ml_score, a.ml_status, a.source_link,
+                   (SELECT GROUP_CONCAT(c.category_name, ', ')
+                    FROM article_category ac
+                    JOIN categories c ON ac.category_id = c.category_id
+                    WHERE ac.article_id = a.article_id) AS category_list
+            FROM articles a
+            LEFT JOIN users u ON a.submitter_id = u.user_id
+            WHERE a.deleted_at IS NULL
+        """
+        params = []
+        if before_date is not None and before_id is not None:
+            query += " AND (a.publication_date, a.article_id) < (?, ?)"
+            params.extend([before_date, before_id])
+        query += " ORDER BY a.publication_date DESC, a.article_id DESC LIMIT ?"
+        # Fetch one extra row to know whether there is a next page
+        params.append(limit + 1)
+
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        articles = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = articles[-1]
+            next_cursor = (last['publication_date'], last['article_id'])
+        return articles, next_cursor
+    finally:
+        conn.close()
+
+def get_comments_for_articles(article_ids):
+    """Fetch the comments of several articles in one query, keyed by article_id."""
+    comments = {article_id: [] for article_id in article_ids}
+    if not article_ids:
+        return comments
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        placeholders = ",".join("?" for _ in article_ids)
+        cur.execute(f"""
+            SELECT r.article_id, r.comment, r.rating_value, r.user_id, u.username
+            FROM ratings r
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.article_id IN ({placeholders}) AND u.deleted_at IS NULL
+            ORDER BY r.article_id, r.rating_id
+        """, list(article_ids))
+        for row in cur.fetchall():
+            comments[row['article_id']].append(row)
+        return comments
+    finally:
+        conn.close()
+
+def get_article(article_id):
     conn = get_connection()
     try:
         cur = conn.cursor()
         cur.execute("""
-            UPDATE articles SET is_fake = ? WHERE article_id = ?
-        """, (is_fake, article_id))
-        conn.commit()
+            SELECT a.article_id, a.title, article_body(b.body, b.compression) AS contents,
+                   a.author_name, a.publication_date, a.overall_rating, a.is_fake,
+                   a.submitter_id, IFNULL(u.username,'Unknown') AS submitter_name,
+                   a.ml_score, a.ml_status, a.source_link
+            FROM articles a
+            LEFT JOIN article_bodies b ON b.article_id = a.article_id
+            LEFT JOIN users u ON a.submitter_id = u.user_id
+            WHERE a.article_id = ? AND a.deleted_at IS NULL
+        """, (article_id,))
+        return cur.fetchone()
     finally:
         conn.close()
 
-def rate_article(user_id, article_id, rating_value, comment=""):
+def get_article_categories(article_id):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT category_id FROM article_category WHERE article_id = ?", (article_id,))
+        category_ids = [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+    # Names come from the category cache instead of a join
+    names = get_category_names()
+    return [names[category_id] for category_id in category_ids if category_id in names]
+
+def get_article_ratings(article_id, before_date=None, before_id=None, limit=None):
+    """
+    Ratings of an article, newest first. Like the dashboard, pages are keyset
+    on (rating_date, rating_id) of the last row; without a limit, all ratings.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        query = """
+            SELECT r.rating_id, r.rating_value, r.comment, r.user_id, u.username, r.rating_date
+            FROM ratings r
+            JOIN users u ON r.user_id = u.user_id
+            JOIN articles a ON r.article_id = a.article_id
+            WHERE r.article_id = ? AND u.deleted_at IS NULL AND a.deleted_at IS NULL
+        """
+        params = [article_id]
+        if before_date is not None and before_id is not None:
+            query += " AND (r.rating_date, r.rating_id) < (?, ?)"
+            params.extend([before_date, before_id])
+        query += " ORDER BY r.rating_date DESC, r.rating_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        cur.execute(query, params)
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+def get_user_profile(user_id):
     conn = get_connection()
     try:
         cur = conn.cursor()
         cur.execute("""
-            INSERT INTO ratings (user_id, article_id, rating_value, comment)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, article_id, rating_value, comment))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+            SELECT user_id, username, email, join_date, profile_picture, bio
+            FROM users
+            WHERE user_id=? AND deleted_at IS NULL
+        """, (user_id,))
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+def get_user_ratings(user_id, before_date=None, before_id=None, limit=None):
+    """Articles a user rated, newest rating first; paged like get_article_ratings."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        query = """
+            SELECT r.rating_id, a.article_id, a.title, r.rating_value, r.comment, r.rating_date
+            FROM ratings r
+            JOIN articles a ON r.article_id = a.article_id
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.user_id = ? AND a.deleted_at IS NULL AND u.deleted_at IS NULL
+        """
+        params = [user_id]
+        if before_date is not None and before_id is not None:
+            query += " AND (r.rating_date, r.rating_id) < (?, ?)"
+            params.extend([before_date, before_id])
+        query += " ORDER BY r.rating_date DESC, r.rating_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        cur.execute(query, params)
+        return cur.fetchall()
     finally:
         conn.close()
 
+def set_articles_fake(article_ids, is_fake):
+    """Mark articles fake (or real) with one UPDATE ... IN; returns how many live articles were updated."""
+    article_ids, placeholders = _id_list(article_ids)
+    if not article_ids:
+        return 0
+    def write(conn):
+        cur = conn.execute(f"""
+            UPDATE articles SET is_fake = ?
+            WHERE article_id IN ({placeholders}) AND deleted_at IS NULL
+        """, [int(bool(is_fake)), *article_ids])
+        return cur.rowcount
+    updated = run_write(write)
+    invalidate_pages("articles", *(f"article:{article_id}" for article_id in article_ids))
+    return updated
+
+def mark_article_as_fake(article_id, is_fake):
+    return set_articles_fake([article_id], is_fake) > 0
+
+# Ratings arriving within this many milliseconds of each other are inserted in
+# one transaction (group commit), so a burst of ratings costs one WAL commit
+RATING_BATCH_MS = float(os.environ.get('UNFAKE_RATING_BATCH_MS', '2'))
+RATING_BATCH_SIZE = 256
+
+def _insert_ratings(conn, ratings):
+    """
+    Insert a batch of (user_id, article_id, rating_value, comment). Per rating:
+    True if inserted, False if the user had already rated the article, or the
+    IntegrityError for a rating that is invalid (unknown or removed article,
+    removed user, bad value).
+    """
+    results = []
+    for rating in ratings:
+        user_id, article_id = rating[0], rating[1]
+        # A rating of a removed article (or by a removed user) would only be purged again
+        cur = conn.execute("""
+            SELECT EXISTS (SELECT 1 FROM articles WHERE article_id = ? AND deleted_at IS NOT NULL)
+                OR EXISTS (SELECT 1 FROM users WHERE user_id = ? AND deleted_at IS NOT NULL)
+        """, (article_id, user_id))
+        if cur.fetchone()[0]:
+            results.append(sqlite3.IntegrityError("the article or user has been removed"))
+            continue
+        try:
+            # UNIQUE(article_id, user_id) turns a second rating into a no-op
+            cur = conn.execute("""
+                INSERT INTO ratings (user_id, article_id, rating_value, comment)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (article_id, user_id) DO NOTHING
+            """, rating)
+            results.append(cur.rowcount == 1)
+        except sqlite3.IntegrityError as e:
+            # Only this statement is undone; the rest of the batch still commits
+            results.append(e)
+    return results
+
+_rating_batcher = WriteBatcher('ratings', run_write, _insert_ratings,
+                               RATING_BATCH_MS / 1000, RATING_BATCH_SIZE)
+
+def rate_article(user_id, article_id, rating_value, comment=""):
+    """
+    True if the rating was saved, False if the user had already rated the
+    article. Raises sqlite3.IntegrityError for an unknown or removed article
+    or a value outside 1-5.
+    """
+    if not _rating_batcher.submit((user_id, article_id, rating_value, comment)):
+        return False
+    invalidate_pages(f"article:{article_id}", "articles", "ratings")
+    return True
+
+# Recomputes rating_sum/rating_count/overall_rating for every article from
+# the ratings table in two set-based statements.
+RECOMPUTE_RATING_AGGREGATES_SQL = (
+    """
+    UPDATE articles
+    SET rating_sum = 0, rating_count = 0, overall_rating = 0
+    WHERE article_id NOT IN (SELECT article_id FROM ratings WHERE article_id IS NOT NULL)
+      AND (rating_sum != 0 OR rating_count != 0 OR overall_rating != 0)
+    """,
+    """
+    UPDATE articles
+    SET rating_sum = agg.total,
+        rating_count = agg.n,
+        overall_rating = ROUND(agg.total * 1.0 / agg.n, 2)
+    FROM (
+        SELECT article_id, SUM(rating_value) AS total, COUNT(*) AS n
+        FROM ratings
+        GROUP BY article_id
+    ) AS agg
+    WHERE articles.article_id = agg.article_id
+      AND (articles.rating_sum != agg.total OR articles.rating_count != agg.n
+           OR articles.overall_rating != ROUND(agg.total * 1.0 / agg.n, 2))
+    """,
+)
+
+def recompute_rating_aggregates():
+    """
+    Backfill/repair the per-article rating aggregates in bulk.
+    Returns the number of articles whose aggregates were corrected.
+    """
+    def write(conn):
+        cur = conn.cursor()
+        fixed = 0
+        for statement in RECOMPUTE_RATING_AGGREGATES_SQL:
+            cur.execute(statement)
+            fixed += cur.rowcount
+        return fixed
+    fixed = run_write(write)
+    if fixed:
+        # Any page may show an aggregate that changed
+        clear_page_cache()
+    return fixed
+
 def get_top_3_users():
     conn = get_connection()
     try:
         cur = conn.cursor()
+        # Count per user from the ratings index first, then join only the top 3
         cur.execute("""
-            SELECT u.username, COUNT(r.rating_id) as rating_count
-            FROM users u
-            JOIN ratings r ON u.user_id = r.user_id
-            GROUP BY u.user_id
-            ORDER BY rating_count DESC
-            LIMIT 3
+            SELECT u.username, top.rating_count
+            FROM (
+                SELECT user_id, COUNT(*) as rating_count
+                FROM ratings
+                WHERE user_id NOT IN (SELECT user_id FROM users WHERE deleted_at IS NOT NULL)
+                GROUP BY user_id
+                ORDER BY rating_count DESC
+                LIMIT 3
+            ) top
+            JOIN users u ON u.user_id = top.user_id
+            ORDER BY top.rating_count DESC
         """)
         return cur.fetchall()
     finally:
         conn.close()
 
-def get_low_credibility_articles():
-    """Get all articles marked as fake or with low credibility rating"""
+def get_low_credibility_articles(before_date=None, before_id=None, limit=None):
+    """
+    Get articles marked as fake or with low credibility rating, newest first.
+    Optionally one keyset page after (before_date, before_id), like the dashboard.
+    """
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("""
+        query = """
             SELECT 
                 article_id,
                 title,
-                contents,
+                excerpt,
                 author_name,
                 publication_date,
                 overall_rating,
@@ -147,8 +751,16 @@ def get_low_credibility_articles():
                 ml_score,
                 source_link
             FROM v_low_credibility
-            ORDER BY publication_date DESC
-        """)
+        """
+        params = []
+        if before_date is not None and before_id is not None:
+            query += " WHERE (publication_date, article_id) < (?, ?)"
+            params.extend([before_date, before_id])
+        query += " ORDER BY publication_date DESC, article_id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        cur.execute(query, params)
         articles = cur.fetchall()
         return articles
     except Exception as e:
@@ -157,201 +769,679 @@ def get_low_credibility_articles():
     finally:
         conn.close()
 
-def get_categories():
+# Categories are cached per process, as a list sorted by name and an
+# id -> name map. add_category/remove_category drop the cache at once; changes
+# made by other processes bump cache_generations (by trigger), which is
+# checked at most every CATEGORY_CHECK_SECONDS.
+CATEGORY_CHECK_SECONDS = float(os.environ.get('UNFAKE_CATEGORY_CHECK_SECONDS', '1'))
+
+def _read_category_generation():
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT category_id, category_name FROM categories ORDER BY category_name")
-        return cur.fetchall()
+        cur.execute("SELECT generation FROM cache_generations WHERE name = 'categories'")
+        return cur.fetchone()[0]
     finally:
         conn.close()
 
-def insert_article_category(article_id, category_id):
+def _load_categories():
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("""
+        # Generation first: a change in between only costs one more reload
+        cur.execute("SELECT generation FROM cache_generations WHERE name = 'categories'")
+        generation = cur.fetchone()[0]
+        cur.execute("SELECT category_id, category_name FROM categories ORDER BY category_name")
+        rows = tuple(cur.fetchall())
+    finally:
+        conn.close()
+    return generation, (rows, {row['category_id']: row['category_name'] for row in rows})
+
+_category_cache = GenerationCache(_load_categories, _read_category_generation, CATEGORY_CHECK_SECONDS)
+
+def get_categories():
+    """Every category as (category_id, category_name) rows, sorted by name. Don't modify the result."""
+    return _category_cache.get()[0]
+
+def get_category_names():
+    """category_id -> category_name for every category. Don't modify the result."""
+    return _category_cache.get()[1]
+
+def get_category_cache_stats():
+    return {'hits': _category_cache.hits, 'reloads': _category_cache.reloads}
+
+def insert_article_category(article_id, category_id):
+    def write(conn):
+        conn.execute("""
             INSERT INTO article_category (article_id, category_id)
             VALUES (?, ?)
         """, (article_id, category_id))
-        conn.commit()
+    run_write(write)
+    invalidate_pages(f"article:{article_id}", "articles")
+
+# ============ MACHINE LEARNING STUFF ============
+
+def update_ml_score(article_id, score):
+    def write(conn):
+        conn.execute("""
+            UPDATE articles SET ml_score = ?, ml_status = 'scored' WHERE article_id = ?
+        """, (score, article_id))
+    run_write(write)
+    invalidate_pages(f"article:{article_id}", "articles")
+
+def iter_article_texts(after_id=0, chunk_size=1000):
+    """
+    Stream (article_id, contents) pairs in article_id order, one chunk (list)
+    at a time, starting after after_id. Each chunk is a separate keyset query,
+    so no connection or cursor is held between chunks.
+    """
+    while True:
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT article_id, article_body(body, compression) AS contents
+                FROM article_bodies
+                WHERE article_id > ?
+                ORDER BY article_id
+                LIMIT ?
+            """, (after_id, chunk_size))
+            chunk = [(row['article_id'], row['contents']) for row in cur.fetchall()]
+        finally:
+            conn.close()
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+def update_ml_scores(scores, job_name=None):
+    """
+    Write many (article_id, score) pairs in one transaction. If job_name is
+    given, the job's checkpoint is moved to the highest article_id written in
+    the same transaction, so a crashed job resumes exactly where it stopped.
+    """
+    scores = list(scores)
+    if not scores:
+        return 0
+    def write(conn):
+        cur = conn.cursor()
+        cur.executemany("""
+            UPDATE articles SET ml_score = ?, ml_status = 'scored' WHERE article_id = ?
+        """, [(score, article_id) for article_id, score in scores])
+        if job_name:
+            cur.execute("""
+                INSERT INTO job_checkpoints (job_name, last_id, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(job_name) DO UPDATE
+                SET last_id = excluded.last_id, updated_at = excluded.updated_at
+            """, (job_name, max(article_id for article_id, _ in scores)))
+    run_write(write)
+    invalidate_pages("articles", *(f"article:{article_id}" for article_id, _ in scores))
+    return len(scores)
+
+def get_pending_articles(limit, exclude_ids=()):
+    """Oldest articles still waiting for an ML score, skipping ones already being scored."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        query = """
+            SELECT a.article_id, article_body(b.body, b.compression) AS contents
+            FROM articles a
+            LEFT JOIN article_bodies b ON b.article_id = a.article_id
+            WHERE a.ml_status = 'pending' AND a.deleted_at IS NULL
+        """
+        params = list(exclude_ids)
+        if params:
+            query += f" AND a.article_id NOT IN ({','.join('?' for _ in params)})"
+        query += " ORDER BY a.article_id LIMIT ?"
+        params.append(limit)
+        cur.execute(query, params)
+        return [(row['article_id'], row['contents']) for row in cur.fetchall()]
     finally:
         conn.close()
 
-# ============ MACHINE LEARNING STUFF ============
+def mark_ml_failed(article_ids):
+    def write(conn):
+        conn.executemany("""
+            UPDATE articles SET ml_status = 'failed' WHERE article_id = ?
+        """, [(article_id,) for article_id in article_ids])
+    run_write(write)
+    invalidate_pages(*(f"article:{article_id}" for article_id in article_ids))
 
-def load_or_train_ml_model():
-    global _model_pipeline
-    model_file = "ml_model.pkl"
-
-    if os.path.exists(model_file):
-        with open(model_file, "rb") as f:
-            _model_pipeline = pickle.load(f)
-        return
-
-    data = [
-        ("Breaking news about economy stocks soared", 1),
-        ("Click here for cheap pills guaranteed miracle", 0),
-        ("Local election updates show new policies", 1),
-        ("Win big money with one trick", 0),
-        ("Technology advances with new AI model", 1),
-        ("Gossip about celebrities unbelievable secret", 0)
-    ]
-    texts = [d[0] for d in data]
-    labels = [d[1] for d in data]
-
-    vec = TfidfVectorizer()
-    clf = LogisticRegression()
-    _model_pipeline = Pipeline([
-        ("tfidf", vec),
-        ("clf", clf)
-    ])
-    _model_pipeline.fit(texts, labels)
-
-    with open(model_file, "wb") as f:
-        pickle.dump(_model_pipeline, f)
-
-def ml_analyze_article(contents, source_link):
-    # Placeholder for ML analysis
-    return 0.5
+def requeue_failed_articles():
+    """Put articles whose scoring failed back in the queue. Returns how many."""
+    def write(conn):
+        cur = conn.execute("""
+            UPDATE articles SET ml_status = 'pending', ml_queued_at = ?
+            WHERE ml_status = 'failed'
+        """, (time.time(),))
+        return cur.rowcount
+    return run_write(write)
 
-def update_ml_score(article_id, score):
+def get_scoring_backlog():
+    """Return (number of pending articles, queued_at of the oldest one or None)."""
     conn = get_connection()
     try:
         cur = conn.cursor()
         cur.execute("""
-            UPDATE articles SET ml_score = ? WHERE article_id = ?
-        """, (score, article_id))
-        conn.commit()
+            SELECT COUNT(*) AS depth, MIN(ml_queued_at) AS oldest
+            FROM articles WHERE ml_status = 'pending' AND deleted_at IS NULL
+        """)
+        row = cur.fetchone()
+        return row['depth'], row['oldest']
+    finally:
+        conn.close()
+
+def get_job_checkpoint(job_name):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT last_id FROM job_checkpoints WHERE job_name = ?", (job_name,))
+        row = cur.fetchone()
+        return row['last_id'] if row else 0
     finally:
         conn.close()
 
+def clear_job_checkpoint(job_name):
+    def write(conn):
+        conn.execute("DELETE FROM job_checkpoints WHERE job_name = ?", (job_name,))
+    run_write(write)
+
 # ============ SEARCH FUNCTION ============
 
-def search_articles_db(category=None, min_rating=None, publication_date=None, username=None):
+def search_articles_db(sort=None, after=None, limit=None, **filters):
+    """
+    Articles matching the filters (see search.filter_sql) in the given sort
+    order: best match first when q is given, otherwise newest first. For
+    keyset paging pass limit and, for later pages, after = search.sort_key()
+    of the last row. Raises ValueError for a malformed filter.
+    """
+    query, params = search_sql(sort, after, limit, **filters)
     conn = get_connection()
     try:
         cur = conn.cursor()
-        query = """
-            SELECT DISTINCT a.article_id, a.title, a.contents, a.author_name,
-                   a.publication_date, a.overall_rating, a.is_fake,
-                   a.submitter_id, u.username as submitter_name,
-                   a.ml_score, a.source_link
-            FROM articles a
-            LEFT JOIN users u ON a.submitter_id = u.user_id
-            LEFT JOIN article_category ac ON a.article_id = ac.article_id
-            LEFT JOIN categories c ON ac.category_id = c.category_id
-            WHERE 1=1
-        """
-        params = []
-        
-        if category:
-            query += " AND c.category_name = ?"
-            params.append(category)
-        if min_rating:
-            query += " AND a.overall_rating >= ?"
-            params.append(float(min_rating))
-        if publication_date:
-            query += " AND DATE(a.publication_date) = DATE(?)"
-            params.append(publication_date)
-        if username:
-            query += " AND u.username = ?"
-            params.append(username)
-            
-        query += " ORDER BY a.publication_date DESC"
-        
         cur.execute(query, params)
         return cur.fetchall()
     finally:
         conn.close()
 
-# ============ CATEGORY MANAGEMENT ============
+# Facet counts per filter combination; the most used combinations stay cached
+FACET_CACHE_SIZE = 256
+_facet_cache = data_cache(FACET_CACHE_SIZE)
 
-def add_category(category_name, description=""):
+def get_search_facets(**filters):
+    """
+    Facet counts of the articles matching the filters (see search.group_facets),
+    computed by one query and cached per filter combination until an article,
+    rating or category changes.
+    """
+    key = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                       for name, value in filters.items()))
+    facets = _facet_cache.get(key)
+    if facets is not None:
+        return facets
+    tags = ("articles", "categories")
+    versions = _facet_cache.versions(tags)
+    query, params = facet_sql(**filters)
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("""
+        cur.execute(query, params)
+        facets = group_facets(cur.fetchall())
+    finally:
+        conn.close()
+    _facet_cache.put(key, facets, tags, versions)
+    return facets
+
+def get_facet_cache_stats():
+    return {'size': len(_facet_cache), 'hits': _facet_cache.hits, 'misses': _facet_cache.misses}
+
+def rebuild_search_index():
+    """Re-index every article from scratch (backfill for existing databases)."""
+    def write(conn):
+        cur = conn.cursor()
+        cur.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+        cur.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
+        cur.execute("SELECT COUNT(*) FROM articles")
+        return cur.fetchone()[0]
+    return run_write(write)
+
+# ============ EXPORT ============
+
+# Rows pulled from SQLite per fetchmany() call while exporting
+EXPORT_FETCH_SIZE = 500
+
+EXPORT_ARTICLE_COLUMNS = (
+    'article_id', 'title', 'contents', 'author_name', 'source_link', 'publication_date',
+    'submitter_id', 'submitter_name', 'categories', 'overall_rating', 'rating_count',
+    'is_fake', 'ml_score', 'ml_status'
+)
+EXPORT_RATING_COLUMNS = (
+    'rating_id', 'article_id', 'user_id', 'username', 'rating_value', 'comment', 'rating_date'
+)
+
+def _iter_query(query, params, fetch_size):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        conn.close()
+
+def iter_export_articles(q=None, title=None, fetch_size=EXPORT_FETCH_SIZE, **filters):
+    """
+    Yield every article matching the search filters (see search.filter_sql),
+    in article_id order, with rows fetched fetch_size at a time so memory use
+    doesn't grow with the corpus.
+    """
+    match = match_expression(q, title)
+    query = """
+        SELECT a.article_id, a.title, article_body(b.body, b.compression) AS contents,
+               a.author_name, a.source_link, a.publication_date,
+               a.submitter_id, u.username AS submitter_name,
+               (SELECT GROUP_CONCAT(c.category_name, ';')
+                FROM article_category ac
+                JOIN categories c ON ac.category_id = c.category_id
+                WHERE ac.article_id = a.article_id) AS categories,
+               a.overall_rating, a.rating_count, a.is_fake, a.ml_score, a.ml_status
+    """
+    if match:
+        query += " FROM articles_fts JOIN articles a ON a.article_id = articles_fts.rowid"
+    else:
+        query += " FROM articles a"
+    query += (" LEFT JOIN article_bodies b ON b.article_id = a.article_id"
+              " LEFT JOIN users u ON a.submitter_id = u.user_id")
+    conditions, params = filter_sql(match, **filters)
+    where = where_sql(conditions)
+    # Both orders come straight off the rowid, so nothing is sorted in memory
+    query += where + (" ORDER BY articles_fts.rowid" if match else " ORDER BY a.article_id")
+    return _iter_query(query, params, fetch_size)
+
+def iter_export_ratings(q=None, title=None, fetch_size=EXPORT_FETCH_SIZE, **filters):
+    """Yield every rating of the articles matching the search filters, like iter_export_articles."""
+    match = match_expression(q, title)
+    query = """
+        SELECT r.rating_id, r.article_id, r.user_id, ru.username, r.rating_value,
+               r.comment, r.rating_date
+    """
+    if match:
+        query += " FROM articles_fts JOIN articles a ON a.article_id = articles_fts.rowid"
+    else:
+        query += " FROM articles a"
+    query += """
+        JOIN ratings r ON r.article_id = a.article_id
+        LEFT JOIN users ru ON r.user_id = ru.user_id
+        LEFT JOIN users u ON a.submitter_id = u.user_id
+    """
+    conditions, params = filter_sql(match, **filters)
+    conditions.append("ru.deleted_at IS NULL")
+    where = where_sql(conditions)
+    # Ratings of one article come off the (article_id, user_id) index already in user order
+    query += where + (" ORDER BY articles_fts.rowid" if match else " ORDER BY a.article_id, r.user_id")
+    return _iter_query(query, params, fetch_size)
+
+# ============ CATEGORY MANAGEMENT ============
+
+def add_category(category_name, description=""):
+    def write(conn):
+        conn.execute("""
             INSERT INTO categories (category_name, description)
             VALUES (?, ?)
         """, (category_name, description))
-        conn.commit()
-        return True
+    try:
+        run_write(write)
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
+    _category_cache.invalidate()
+    invalidate_pages("categories")
+    return True
 
 def remove_category(category_id):
-    conn = get_connection()
-    try:
+    def write(conn):
         cur = conn.cursor()
+        # foreign_keys is on, so drop the links to this category first
+        cur.execute("DELETE FROM article_category WHERE category_id = ?", (category_id,))
         cur.execute("DELETE FROM categories WHERE category_id = ?", (category_id,))
-        conn.commit()
-    finally:
-        conn.close()
+    run_write(write)
+    _category_cache.invalidate()
+    invalidate_pages("categories", "articles")
 
-# ============ ARTICLE MANAGEMENT ============
+# ============ ADMIN ============
 
-def remove_article(article_id):
+def get_admin_users(prefix=None, after=None, limit=50):
+    """
+    One page of users in username order, optionally only those whose username
+    starts with prefix, with how many articles and ratings each has. For the
+    next page pass after = the last username shown.
+    """
+    conditions = ["u.deleted_at IS NULL"]
+    params = []
+    if prefix:
+        # A range on the username index rather than LIKE, which can't use it
+        conditions.append("u.username >= ? AND u.username < ?")
+        params.extend([prefix, prefix + "\U0010ffff"])
+    if after is not None:
+        conditions.append("u.username > ?")
+        params.append(after)
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("DELETE FROM articles WHERE article_id = ?", (article_id,))
-        conn.commit()
+        cur.execute(f"""
+            SELECT u.user_id, u.username, u.email, u.role,
+                   (SELECT COUNT(*) FROM articles a
+                    WHERE a.submitter_id = u.user_id AND a.deleted_at IS NULL) AS article_count,
+                   (SELECT COUNT(*) FROM ratings r
+                    JOIN articles a ON a.article_id = r.article_id
+                    WHERE r.user_id = u.user_id AND a.deleted_at IS NULL) AS rating_count
+            FROM users u{where_sql(conditions)}
+            ORDER BY u.username
+            LIMIT ?
+        """, [*params, limit])
+        return cur.fetchall()
     finally:
         conn.close()
 
-def update_password(username, new_password):
-    conn = get_connection()
+# ============ ARTICLE MANAGEMENT ============
+
+def _id_list(ids):
+    """Distinct integer ids, in the order given, and the matching "?, ?, ..." placeholders."""
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    return ids, ", ".join("?" * len(ids))
+
+def remove_articles(article_ids):
+    """
+    Remove articles: they disappear from every page at once (deleted_at is
+    set, one UPDATE ... IN) and the purge job deletes them with their
+    ratings, categories and bodies later. Returns how many articles existed
+    and were removed.
+    """
+    article_ids, placeholders = _id_list(article_ids)
+    if not article_ids:
+        return 0
+    def write(conn):
+        cur = conn.execute(f"""
+            UPDATE articles SET deleted_at = CURRENT_TIMESTAMP
+            WHERE article_id IN ({placeholders}) AND deleted_at IS NULL
+        """, article_ids)
+        return cur.rowcount
+    removed = run_write(write)
+    invalidate_pages("articles", "ratings", *(f"article:{article_id}" for article_id in article_ids))
+    return removed
+
+def remove_article(article_id):
+    return remove_articles([article_id]) > 0
+
+def _hide_user_articles(conn, user_id, after, limit):
+    """
+    Mark the next limit articles of a removed user (in submitter index order,
+    after the (publication_date, article_id) key after) as removed. Returns
+    the key of the last one, or None when there were none left.
+    """
+    query = "SELECT publication_date, article_id FROM articles WHERE submitter_id = ?"
+    params = [user_id]
+    if after is not None:
+        query += " AND (publication_date, article_id) > (?, ?)"
+        params.extend(after)
+    query += " ORDER BY publication_date, article_id LIMIT ?"
+    params.append(limit)
+    rows = conn.execute(query, params).fetchall()
+    if not rows:
+        return None
+    article_ids, placeholders = _id_list(row[1] for row in rows)
+    conn.execute(f"""
+        UPDATE articles SET deleted_at = CURRENT_TIMESTAMP
+        WHERE article_id IN ({placeholders}) AND deleted_at IS NULL
+    """, article_ids)
+    return tuple(rows[-1])
+
+def remove_user(user_id):
+    """
+    Remove a user and the articles they submitted, hidden like
+    remove_articles; the purge job deletes them with the user's ratings
+    later. Returns False if there is no such user.
+    """
+    def write(conn):
+        cur = conn.execute("""
+            UPDATE users SET deleted_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND deleted_at IS NULL
+            RETURNING username
+        """, (user_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    username = run_write(write)
+    if username is None:
+        return False
+    forget_user(username)
+    # PURGE_BATCH_SIZE articles per transaction, so other writes get in
+    # between even when the user submitted tens of thousands
+    after = run_write(_hide_user_articles, user_id, None, PURGE_BATCH_SIZE)
+    while after is not None:
+        after = run_write(_hide_user_articles, user_id, after, PURGE_BATCH_SIZE)
+    # The user's ratings show on any number of article pages
+    clear_page_cache()
+    return True
+
+def update_profile(user_id, bio, profile_picture):
+    def write(conn):
+        conn.execute("""
+            UPDATE users SET bio = ?, profile_picture = ? WHERE user_id = ?
+        """, (bio, profile_picture, user_id))
+    run_write(write)
+
+def update_password(user_id, new_password):
+    def write(conn):
+        conn.execute("""
+            UPDATE users SET password = ? WHERE user_id = ?
+        """, (new_password, user_id))
     try:
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE users SET password = ? WHERE username = ?
-        """, (new_password, username))
-        conn.commit()
+        run_write(write)
         return True
     except Exception as e:
         print(f"Error updating password: {e}")
         return False
-    finally:
-        conn.close()
 
 def create_article(title, contents, author_name, source_link, submitter_id, categories):
     """
     Create a new article with categories in a single transaction.
     Returns the article_id if successful, None if failed.
     """
-    conn = get_connection()
-    try:
+    def write(conn):
         cur = conn.cursor()
         
-        # Insert article
+        # Insert article; it is scored later by the background scoring queue
         cur.execute("""
-            INSERT INTO articles (title, contents, author_name, source_link, submitter_id)
-            VALUES (?, ?, ?, ?, ?)
-        """, (title, contents, author_name, source_link, submitter_id))
+            INSERT INTO articles (title, excerpt, author_name, source_link, submitter_id,
+                                  ml_status, ml_queued_at)
+            VALUES (?, ?, ?, ?, ?, 'pending', ?)
+        """, (title, make_excerpt(contents), author_name, source_link, submitter_id, time.time()))
         
         article_id = cur.lastrowid
         
+        # The body goes in its own table; a trigger adds it to the search index
+        cur.execute("""
+            INSERT INTO article_bodies (article_id, body, compression)
+            VALUES (?, ?, ?)
+        """, (article_id, *encode_body(contents)))
+        
         # Insert categories
         for category_id in categories:
             cur.execute("""
                 INSERT INTO article_category (article_id, category_id)
                 VALUES (?, ?)
             """, (article_id, category_id))
-        
-        # Run ML analysis and update score
-        score = ml_analyze_article(contents, source_link)
-        cur.execute("""
-            UPDATE articles SET ml_score = ? WHERE article_id = ?
-        """, (score, article_id))
-        
-        conn.commit()
         return article_id
+    try:
+        article_id = run_write(write)
     except Exception as e:
-        conn.rollback()
         print(f"Error submitting article: {e}")
         return None
+    invalidate_pages(f"article:{article_id}", "articles")
+    return article_id
+
+
+# ============ PURGE ============
+
+# Rows deleted per purge transaction, so removing a prolific user never holds
+# the write lock for long; other writes run between batches
+PURGE_BATCH_SIZE = int(os.environ.get('UNFAKE_PURGE_BATCH_SIZE', '500'))
+
+# (step, statement) in dependency order: foreign_keys is on, so a row only
+# goes once nothing refers to it any more. Each statement takes the batch's
+# remaining row budget and returns the article_id of every row it touched
+# (NULL for users).
+PURGE_STEPS = (
+    # Articles submitted while their user was being removed; only looked for
+    # once the user's removed articles are gone, so they aren't read each time
+    ('articles_of_removed_users', """
+        UPDATE articles SET deleted_at = CURRENT_TIMESTAMP
+        WHERE article_id IN (
+            SELECT a.article_id FROM users u
+            JOIN articles a ON a.submitter_id = u.user_id
+            WHERE u.deleted_at IS NOT NULL AND a.deleted_at IS NULL
+              AND NOT EXISTS (SELECT 1 FROM articles d
+                              WHERE d.submitter_id = u.user_id AND d.deleted_at IS NOT NULL)
+            LIMIT ?)
+        RETURNING article_id
+    """),
+    # The rating triggers keep rating_sum/rating_count/overall_rating in step
+    ('ratings_by_removed_users', """
+        DELETE FROM ratings WHERE rating_id IN (
+            SELECT r.rating_id FROM users u
+            JOIN ratings r ON r.user_id = u.user_id
+            WHERE u.deleted_at IS NOT NULL
+            LIMIT ?)
+        RETURNING article_id
+    """),
+    ('ratings', """
+        DELETE FROM ratings WHERE rating_id IN (
+            SELECT r.rating_id FROM articles a
+            JOIN ratings r ON r.article_id = a.article_id
+            WHERE a.deleted_at IS NOT NULL
+            LIMIT ?)
+        RETURNING article_id
+    """),
+    ('article_categories', """
+        DELETE FROM article_category WHERE rowid IN (
+            SELECT ac.rowid FROM articles a
+            JOIN article_category ac ON ac.article_id = a.article_id
+            WHERE a.deleted_at IS NOT NULL
+            LIMIT ?)
+        RETURNING article_id
+    """),
+    # The body (and its search index entry) goes with the article, by trigger
+    ('articles', """
+        DELETE FROM articles WHERE article_id IN (
+            SELECT a.article_id FROM articles a
+            WHERE a.deleted_at IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM ratings r WHERE r.article_id = a.article_id)
+              AND NOT EXISTS (SELECT 1 FROM article_category ac WHERE ac.article_id = a.article_id)
+            LIMIT ?)
+        RETURNING article_id
+    """),
+    ('users', """
+        DELETE FROM users WHERE user_id IN (
+            SELECT u.user_id FROM users u
+            WHERE u.deleted_at IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM articles a WHERE a.submitter_id = u.user_id)
+              AND NOT EXISTS (SELECT 1 FROM ratings r WHERE r.user_id = u.user_id)
+            LIMIT ?)
+        RETURNING NULL
+    """),
+)
+
+def purge_removed(limit=PURGE_BATCH_SIZE):
+    """
+    Delete up to limit rows belonging to removed articles and users, in one
+    transaction. Returns {step: rows} (see PURGE_STEPS); a total of 0 means
+    there was nothing left to purge.
+    """
+    def write(conn):
+        purged = {}
+        article_ids = set()
+        budget = limit
+        for step, statement in PURGE_STEPS:
+            rows = conn.execute(statement, (budget,)).fetchall() if budget > 0 else []
+            purged[step] = len(rows)
+            article_ids.update(row[0] for row in rows if row[0] is not None)
+            budget -= len(rows)
+        return purged, article_ids
+    purged, article_ids = run_write(write)
+    if article_ids:
+        # Ratings of removed users change the averages of articles still shown
+        invalidate_pages("articles", "ratings", *(f"article:{article_id}" for article_id in article_ids))
+    return purged
+
+def get_purge_backlog():
+    """Return (removed articles, removed users) still waiting for the purge job."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM articles WHERE deleted_at IS NOT NULL),
+                   (SELECT COUNT(*) FROM users WHERE deleted_at IS NOT NULL)
+        """)
+        return tuple(cur.fetchone())
     finally:
         conn.close()
+
+# Rows left dangling by deletes made without foreign key enforcement (older
+# versions deleted only the articles row; plain sqlite3 connections don't
+# turn foreign_keys on): (table, orphan condition on the row aliased t, repair)
+ORPHAN_REPAIRS = (
+    ('ratings', """NOT EXISTS (SELECT 1 FROM articles a WHERE a.article_id = t.article_id)
+                   OR NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = t.user_id)""",
+     "DELETE FROM ratings AS t"),
+    ('article_category', """NOT EXISTS (SELECT 1 FROM articles a WHERE a.article_id = t.article_id)
+                            OR NOT EXISTS (SELECT 1 FROM categories c WHERE c.category_id = t.category_id)""",
+     "DELETE FROM article_category AS t"),
+    ('article_bodies', "NOT EXISTS (SELECT 1 FROM articles a WHERE a.article_id = t.article_id)",
+     "DELETE FROM article_bodies AS t"),
+    # Articles outlive a missing submitter, shown as "Unknown"
+    ('articles', """t.submitter_id IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = t.submitter_id)""",
+     "UPDATE articles AS t SET submitter_id = NULL"),
+)
+
+def repair_orphans(batch_size=PURGE_BATCH_SIZE, scan_size=10000):
+    """
+    Delete (or detach) orphaned rows, see ORPHAN_REPAIRS. Each table is
+    scanned scan_size rows at a time in rowid order on a read connection; only
+    the orphans found are written, batch_size per transaction, each one
+    re-checked by the write. Returns {table: rows repaired}.
+    """
+    repaired = {}
+    for table, condition, statement in ORPHAN_REPAIRS:
+        repaired[table] = 0
+        after = 0
+        while True:
+            conn = get_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute(f"""
+                    SELECT t.rowid, {condition} AS orphan FROM {table} t
+                    WHERE t.rowid > ?
+                    ORDER BY t.rowid
+                    LIMIT ?
+                """, (after, scan_size))
+                rows = cur.fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                break
+            after = rows[-1][0]
+            orphans = [row[0] for row in rows if row[1]]
+            for i in range(0, len(orphans), batch_size):
+                rowids, placeholders = _id_list(orphans[i:i + batch_size])
+                def write(conn):
+                    cur = conn.execute(f"{statement} WHERE t.rowid IN ({placeholders}) AND ({condition})",
+                                       rowids)
+                    return cur.rowcount
+                repaired[table] += run_write(write)
+    if any(repaired.values()):
+        clear_page_cache()
+    return repaired
@@ -0,0 +1,80 @@
+# export.py
+# Serialize exported rows as NDJSON or CSV, chunk by chunk, optionally gzipped.
+# Used by the /admin/export endpoints and export_data.py; everything here is a
+# generator so an export never holds more than one chunk in memory.
+import csv
+import io
+import json
+import zlib
+
+from db import (
+    EXPORT_ARTICLE_COLUMNS,
+    EXPORT_RATING_COLUMNS,
+    iter_export_articles,
+    iter_export_ratings
+)
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+# Serialized text is handed out in pieces of roughly this many bytes
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+DATASETS = {
+    'articles': (EXPORT_ARTICLE_COLUMNS, iter_export_articles),
+    'ratings': (EXPORT_RATING_COLUMNS, iter_export_ratings),
+}
+
+
+def _ndjson_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+
+def _csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def _chunked(lines, chunk_size):
+    parts = []
+    size = 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(parts).encode('utf-8')
+            parts = []
+            size = 0
+    if parts:
+        yield "".join(parts).encode('utf-8')
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_rows(rows, columns, fmt, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the rows serialized as bytes in fmt ('ndjson' or 'csv')."""
+    if fmt == 'ndjson':
+        lines = _ndjson_lines(rows, columns)
+    elif fmt == 'csv':
+        lines = _csv_lines(rows, columns)
+    else:
+        raise ValueError(f"unsupported export format: {fmt}")
+    chunks = _chunked(lines, chunk_size)
+    return _gzipped(chunks) if compress else chunks
+
+def export_dataset(dataset, fmt, compress=False, **filters):
+    """Stream a whole dataset ('articles' or 'ratings') matching the search filters."""
+    columns, iter_rows = DATASETS[dataset]
+    return export_rows(iter_rows(**filters), columns, fmt, compress)
+
+def export_filename(dataset, fmt, compress=False):
+    return f"{dataset}.{fmt}" + (".gz" if compress else "")
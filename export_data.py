@@ -0,0 +1,71 @@
+# export_data.py
+# Export articles or ratings for offline analysis, streamed from the database.
+#
+#   python export_data.py articles -o articles.ndjson
+#   python export_data.py ratings --format csv --gzip -o ratings.csv.gz
+#   python export_data.py articles --category Politics --min-rating 3 > politics.ndjson
+#   python export_data.py articles --category Health --category Science --category-match all \
+#       --date-from 2024-01-01 --date-to 2024-06-30 -o health_science.ndjson
+#
+# Takes the same filters as the search page.
+import argparse
+import sys
+import time
+
+from export import DATASETS, EXPORT_FORMATS, export_dataset
+from search import CATEGORY_MATCHES, check_filters
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream articles or ratings as NDJSON or CSV.")
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson',
+                        help="output format (default ndjson)")
+    parser.add_argument('--gzip', action='store_true', help="gzip the output")
+    parser.add_argument('-o', '--output', help="output file (default stdout)")
+    parser.add_argument('--category', action='append', help="category name (repeat for several)")
+    parser.add_argument('--category-match', choices=CATEGORY_MATCHES, default='any',
+                        help="articles in any (default) or all of the categories")
+    parser.add_argument('--min-rating', type=float)
+    parser.add_argument('--publication-date', help="YYYY-MM-DD")
+    parser.add_argument('--date-from', help="YYYY-MM-DD, inclusive")
+    parser.add_argument('--date-to', help="YYYY-MM-DD, inclusive")
+    parser.add_argument('--min-ml-score', type=float)
+    parser.add_argument('--max-ml-score', type=float)
+    parser.add_argument('--is-fake', choices=('0', '1'))
+    parser.add_argument('--username', help="submitter's username")
+    parser.add_argument('-q', '--query', help="full-text search terms")
+    parser.add_argument('--title', help="full-text search terms, matched against titles only")
+    args = parser.parse_args()
+
+    filters = {
+        'category': args.category,
+        'category_match': args.category_match,
+        'min_rating': args.min_rating,
+        'publication_date': args.publication_date,
+        'date_from': args.date_from,
+        'date_to': args.date_to,
+        'min_ml_score': args.min_ml_score,
+        'max_ml_score': args.max_ml_score,
+        'is_fake': args.is_fake,
+        'username': args.username,
+        'q': args.query,
+        'title': args.title,
+    }
+    try:
+        check_filters(**filters)
+    except ValueError as e:
+        parser.error(str(e))
+    chunks = export_dataset(args.dataset, args.format, args.gzip, **filters)
+
+    started = time.perf_counter()
+    written = 0
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"Exported {written / 1e6:.1f} MB of {args.dataset} in {elapsed:.1f} s", file=sys.stderr)
@@ -0,0 +1,182 @@
+# generate_data.py
+# Fill the database with synthetic users, articles, categories and ratings for
+# load tests. Popularity is skewed the way real traffic is: a few users submit
+# and rate most of the content, a few articles collect most of the ratings,
+# and recent dates are more common than old ones.
+#
+#   python generate_data.py --users 2000 --articles 50000 --ratings 500000
+#   UNFAKE_DB_PATH=bench.db python generate_data.py --reset --seed 7
+#
+# The same arguments and --seed always produce the same data. Every generated
+# user's password is "password" (usernames are user<user_id>).
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+from db import DB_PATH, encode_body, make_excerpt, register_sql_functions
+from schema_creation import create_schema
+
+GENERATED_PASSWORD = 'password'
+BATCH_SIZE = 10000
+
+WORDS = (
+    "government election president minister policy vote campaign senate law court "
+    "economy market stocks inflation bank money tax trade jobs growth company "
+    "study research scientists university data report survey health doctors vaccine "
+    "climate weather energy oil water city police crime fire storm "
+    "technology software phone internet ai startup apple google security hack "
+    "team game season player coach win match league cup final "
+    "shocking secret miracle cure exposed truth hidden banned leaked conspiracy "
+    "officials confirmed sources said announced according new record year week"
+).split()
+
+
+def zipf_cum_weights(n, skew):
+    """Cumulative weights where the k-th item is picked ~1/k^skew as often."""
+    return list(accumulate(1.0 / (k ** skew) for k in range(1, n + 1)))
+
+def pick(rng, ids, cum_weights, k):
+    return rng.choices(ids, cum_weights=cum_weights, k=k)
+
+def text(rng, min_words, max_words):
+    # lognormal-ish length: mostly short, some long
+    n = min(max_words, max(min_words, int(rng.lognormvariate(0, 0.6) * min_words)))
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+def recent_date(rng, today, days):
+    # Squaring the uniform draw puts more articles in recent days
+    return today - timedelta(days=int(days * rng.random() ** 2))
+
+def insert_batches(conn, sql, rows, label):
+    """
+    executemany() rows in committed batches. sql may also be a tuple of
+    statements, with every row a tuple holding one parameter set for each.
+    """
+    statements = sql if isinstance(sql, tuple) else (sql,)
+    started = time.perf_counter()
+    total = 0
+    batch = []
+
+    def flush():
+        for index, statement in enumerate(statements):
+            conn.executemany(statement, batch if len(statements) == 1 else [row[index] for row in batch])
+        conn.commit()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            flush()
+            total += len(batch)
+            batch = []
+    if batch:
+        flush()
+        total += len(batch)
+    elapsed = time.perf_counter() - started
+    print(f"{total} {label} in {elapsed:.1f} s ({total / elapsed if elapsed > 0 else 0:.0f}/s)")
+    return total
+
+def generate(users, articles, categories, ratings, skew, days, seed):
+    rng = random.Random(seed)
+    today = date.today()
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA synchronous = OFF")
+    # The search index triggers read article bodies through article_body()
+    register_sql_functions(conn)
+    try:
+        existing = conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+        insert_batches(conn, "INSERT OR IGNORE INTO categories (category_name, description) VALUES (?, ?)",
+                       ((f"Category {i}", "Generated category") for i in range(existing + 1, categories + 1)),
+                       "categories")
+        category_ids = [row[0] for row in conn.execute("SELECT category_id FROM categories ORDER BY category_id")]
+
+        first_user = conn.execute("SELECT COALESCE(MAX(user_id), 0) FROM users").fetchone()[0] + 1
+        insert_batches(conn, "INSERT INTO users (username, password, email, join_date) VALUES (?, ?, ?, ?)",
+                       ((f"user{i}", GENERATED_PASSWORD, f"user{i}@example.com",
+                         (today - timedelta(days=rng.randrange(days + 1))).isoformat())
+                        for i in range(first_user, first_user + users)),
+                       "users")
+        user_ids = [row[0] for row in conn.execute("SELECT user_id FROM users ORDER BY user_id")]
+        # Who is popular is random, but fixed by the seed
+        rng.shuffle(user_ids)
+        user_weights = zipf_cum_weights(len(user_ids), skew)
+        category_weights = zipf_cum_weights(len(category_ids), skew)
+
+        # AUTOINCREMENT continues after the highest id ever used, even if deleted
+        first_article = conn.execute(
+            "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'articles'), 0)"
+        ).fetchone()[0] + 1
+
+        def article_rows():
+            for i in range(articles):
+                title, contents = text(rng, 6, 14).capitalize(), text(rng, 80, 1200)
+                yield ((title, make_excerpt(contents), text(rng, 2, 2).title(),
+                        f"https://example.com/news/{first_article + i}",
+                        recent_date(rng, today, days).isoformat(),
+                        pick(rng, user_ids, user_weights, 1)[0],
+                        1 if rng.random() < 0.03 else 0, rng.random()),
+                       (first_article + i, *encode_body(contents)))
+        insert_batches(conn, ("""
+            INSERT INTO articles (title, excerpt, author_name, source_link, publication_date,
+                                  submitter_id, is_fake, ml_score, ml_status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'scored')
+        """, "INSERT INTO article_bodies (article_id, body, compression) VALUES (?, ?, ?)"),
+                       article_rows(), "articles")
+        article_ids = list(range(first_article, first_article + articles))
+
+        def category_rows():
+            for article_id in article_ids:
+                for category_id in set(pick(rng, category_ids, category_weights, rng.randint(1, 3))):
+                    yield (article_id, category_id)
+        insert_batches(conn, "INSERT OR IGNORE INTO article_category (article_id, category_id) VALUES (?, ?)",
+                       category_rows(), "article categories")
+
+        shuffled_articles = list(article_ids)
+        rng.shuffle(shuffled_articles)
+        article_weights = zipf_cum_weights(len(shuffled_articles), skew)
+        ratings = min(ratings, len(user_ids) * len(article_ids))
+
+        def rating_rows():
+            seen = set()
+            now = datetime.now()
+            while len(seen) < ratings:
+                n = min(BATCH_SIZE, ratings - len(seen))
+                for article_id, user_id in zip(pick(rng, shuffled_articles, article_weights, n),
+                                               pick(rng, user_ids, user_weights, n)):
+                    if (article_id, user_id) in seen:
+                        continue
+                    seen.add((article_id, user_id))
+                    rated_at = now - timedelta(seconds=int(days * 86400 * rng.random() ** 2))
+                    yield (article_id, user_id, rng.choices((1, 2, 3, 4, 5), (1, 1, 2, 3, 3))[0],
+                           text(rng, 3, 30), rated_at.strftime('%Y-%m-%d %H:%M:%S'))
+        if articles:
+            insert_batches(conn, """
+                INSERT INTO ratings (article_id, user_id, rating_value, comment, rating_date)
+                VALUES (?, ?, ?, ?, ?)
+            """, rating_rows(), "ratings")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic data for load tests.")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--articles', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=10,
+                        help="total number of categories, including the defaults (default 10)")
+    parser.add_argument('--ratings', type=int, default=50000)
+    parser.add_argument('--skew', type=float, default=1.1,
+                        help="Zipf exponent for user, article and category popularity; 0 is uniform (default 1.1)")
+    parser.add_argument('--days', type=int, default=365, help="spread of publication dates (default 365)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help=f"delete {DB_PATH} first")
+    args = parser.parse_args()
+
+    if args.reset:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+    create_schema()
+    generate(args.users, args.articles, args.categories, args.ratings, args.skew, args.days, args.seed)
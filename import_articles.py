@@ -0,0 +1,52 @@
+# import_articles.py
+# Bulk-import articles from a JSONL or CSV feed.
+#
+#   python import_articles.py feed.jsonl --submitter admin
+#   python import_articles.py feed.csv --submitter admin --rejects rejected.jsonl
+#
+# One record per line (JSONL) or row (CSV) with title, contents, author_name,
+# source_link, publication_date and categories (';'-separated in CSV).
+import argparse
+import json
+import sys
+
+from bulk_import import FORMATS, IMPORT_BATCH_SIZE, detect_format, import_articles, open_text
+from db import get_user_id
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import articles from JSONL or CSV.")
+    parser.add_argument('path', help="file to import, or - for stdin")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="input format (default: from the file extension)")
+    parser.add_argument('--submitter', required=True,
+                        help="username recorded as the submitter of every article")
+    parser.add_argument('--rejects', default='rejected.jsonl',
+                        help="where malformed records are written (default rejected.jsonl)")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                        help=f"articles per transaction and scoring batch (default {IMPORT_BATCH_SIZE})")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if not fmt:
+        parser.error("can't tell the format from the file name; pass --format")
+
+    submitter_id = get_user_id(args.submitter)
+    if not submitter_id:
+        parser.error(f"unknown user {args.submitter!r}")
+
+    with open(args.rejects, 'w', encoding='utf-8') as rejects:
+        def on_reject(line_number, error, record):
+            rejects.write(json.dumps({'line': line_number, 'error': error, 'record': record}) + "\n")
+
+        source = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+        with open_text(source) as text:
+            stats = import_articles(text, fmt, submitter_id, default_author=args.submitter,
+                                    on_reject=on_reject, batch_size=args.batch_size)
+
+    print(f"Imported {stats['imported']} of {stats['read']} records in {stats['seconds']:.1f} s "
+          f"({stats['rows_per_second']:.0f} rows/s)")
+    if stats['rejected']:
+        print(f"{stats['rejected']} records rejected, see {args.rejects}")
+    if stats['pending_scoring']:
+        print(f"{stats['pending_scoring']} articles could not be scored yet; "
+              f"run score_pending.py to score them")
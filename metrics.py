@@ -0,0 +1,334 @@
+# metrics.py
+# Low-overhead request instrumentation, exported in the Prometheus text format.
+#
+# db.py opens every connection as an InstrumentedConnection, whose cursors time
+# each statement (execute plus the fetches that step through its rows) and pass
+# slow ones on to the slow-query log (slow_queries.py). Flask hooks added by
+# init_app() add up per request: route latency, SQL statement count and time,
+# connection checkout time, time spent on writes (which run on the writer
+# thread, see writer.py) and template render time. All of it is served on
+# /metrics; with UNFAKE_SERVER_TIMING=1 every response also gets a
+# Server-Timing header with the breakdown of that request.
+#
+# Metrics live in process memory, so each worker process reports its own.
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+import slow_queries
+
+SERVER_TIMING = os.environ.get('UNFAKE_SERVER_TIMING', '0') == '1'
+# If set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get('UNFAKE_METRICS_TOKEN', '')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+# ============ METRIC TYPES ============
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                yield (f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (le,))} "
+                       f"{cumulative}")
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+REQUEST_SECONDS = Histogram('unfake_http_request_duration_seconds',
+                            "Time to handle a request, by route", ('route', 'method'))
+REQUESTS = Counter('unfake_http_requests_total', "Requests handled", ('route', 'method', 'status'))
+REQUEST_QUERIES = Histogram('unfake_http_request_sql_queries',
+                            "SQL statements run per request, by route", ('route',), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('unfake_http_request_sql_seconds',
+                                "Time spent in SQLite per request, by route", ('route',))
+REQUEST_CONNECT_SECONDS = Histogram('unfake_http_request_db_checkout_seconds',
+                                    "Time to get a pooled connection per request, by route", ('route',))
+REQUEST_RENDER_SECONDS = Histogram('unfake_http_request_render_seconds',
+                                   "Template rendering time per request, by route", ('route',))
+SQL_QUERIES = Counter('unfake_sql_queries_total', "SQL statements run, in or outside requests")
+SQL_SECONDS = Counter('unfake_sql_seconds_total', "Time spent in SQLite, in or outside requests")
+CONNECT_SECONDS = Histogram('unfake_db_connect_seconds', "Time to open a new SQLite connection")
+RENDER_SECONDS = Histogram('unfake_template_render_seconds', "Template rendering time", ('template',))
+WRITE_WAIT_SECONDS = Histogram('unfake_db_write_queue_wait_seconds',
+                               "Time a write waited in the writer queue before it ran")
+WRITE_SECONDS = Histogram('unfake_db_write_seconds', "Time the writer thread spent running a write")
+WRITE_BATCH_SIZE = Histogram('unfake_db_write_batch_size', "Items committed together by a group-commit batch",
+                             ('batcher',), COUNT_BUCKETS)
+WRITE_BATCH_SECONDS = Histogram('unfake_db_write_batch_commit_seconds',
+                                "Time from handing a batch to the writer until it was committed", ('batcher',))
+
+METRICS = [REQUEST_SECONDS, REQUESTS, REQUEST_QUERIES, REQUEST_SQL_SECONDS, REQUEST_CONNECT_SECONDS,
+           REQUEST_RENDER_SECONDS, SQL_QUERIES, SQL_SECONDS, CONNECT_SECONDS, RENDER_SECONDS,
+           WRITE_WAIT_SECONDS, WRITE_SECONDS, WRITE_BATCH_SIZE, WRITE_BATCH_SECONDS]
+
+# Callables returning [(name, type, help, value)] for values read at scrape time
+COLLECTORS = []
+
+def register_collector(collector):
+    COLLECTORS.append(collector)
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    for collector in COLLECTORS:
+        try:
+            for name, kind, help_text, value in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(value)}")
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# ============ SQL TIMING ============
+
+# Totals for the request being handled by this thread (None outside requests)
+_current = threading.local()
+
+def _record_sql(seconds, statements=0):
+    SQL_SECONDS.inc(seconds)
+    if statements:
+        SQL_QUERIES.inc(statements)
+    stats = getattr(_current, 'stats', None)
+    if stats is not None:
+        stats['sql_seconds'] += seconds
+        stats['queries'] += statements
+
+def record_connect(seconds):
+    """Called by the pool whenever it opens a new SQLite connection."""
+    CONNECT_SECONDS.observe(seconds)
+
+def record_write(wait_seconds, run_seconds):
+    """Called by the caller of a write once the writer thread has run it."""
+    WRITE_WAIT_SECONDS.observe(wait_seconds)
+    WRITE_SECONDS.observe(run_seconds)
+    stats = getattr(_current, 'stats', None)
+    if stats is not None:
+        stats['write_seconds'] += wait_seconds + run_seconds
+
+def record_write_batch(batcher, size, seconds):
+    WRITE_BATCH_SIZE.observe(size, batcher)
+    WRITE_BATCH_SECONDS.observe(seconds, batcher)
+
+def record_checkout(seconds):
+    """Called when a request gets its pooled connection."""
+    stats = getattr(_current, 'stats', None)
+    if stats is not None:
+        stats['connect_seconds'] += seconds
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that adds the time of every execute and fetch to the SQL metrics,
+    and hands statements slower than the threshold to the slow-query log.
+    """
+
+    _statement = None  # (sql, params) of the current statement until it is logged
+    _statement_seconds = 0.0
+
+    def _start(self, sql, params):
+        self._statement = (sql, params)
+        self._statement_seconds = 0.0
+        return time.perf_counter()
+
+    def _finish(self, started, statements=0):
+        elapsed = time.perf_counter() - started
+        _record_sql(elapsed, statements)
+        self._statement_seconds += elapsed
+        if self._statement_seconds >= slow_queries.SLOW_QUERY_SECONDS and self._statement is not None:
+            (sql, params), self._statement = self._statement, None
+            slow_queries.record(self.connection, sql, params, self._statement_seconds)
+
+    def execute(self, sql, parameters=()):
+        started = self._start(sql, parameters)
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(started, 1)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = self._start(sql, None)
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(started, 1)
+
+    def executescript(self, sql_script):
+        started = self._start(sql_script, None)
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._finish(started, 1)
+
+    # Rows after the first are produced while fetching, so that time counts too
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._finish(started)
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            self._finish(started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._finish(started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors (including conn.execute's) are timed."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute* make a plain Cursor without calling cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+# ============ FLASK HOOKS ============
+
+def _route():
+    from flask import request
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def init_app(app):
+    """Time every request of app and serve the metrics on /metrics."""
+    from flask import Response, request, before_render_template, template_rendered
+
+    @app.before_request
+    def start_request_metrics():
+        _current.stats = {'started': time.perf_counter(), 'queries': 0, 'sql_seconds': 0.0,
+                          'connect_seconds': 0.0, 'render_seconds': 0.0, 'write_seconds': 0.0,
+                          'render_started': []}
+
+    @app.after_request
+    def finish_request_metrics(response):
+        stats = getattr(_current, 'stats', None)
+        if stats is None:
+            return response
+        route = _route()
+        elapsed = time.perf_counter() - stats['started']
+        REQUEST_SECONDS.observe(elapsed, route, request.method)
+        REQUESTS.inc(1, route, request.method, str(response.status_code))
+        REQUEST_QUERIES.observe(stats['queries'], route)
+        REQUEST_SQL_SECONDS.observe(stats['sql_seconds'], route)
+        REQUEST_CONNECT_SECONDS.observe(stats['connect_seconds'], route)
+        REQUEST_RENDER_SECONDS.observe(stats['render_seconds'], route)
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = (
+                f'db;dur={stats["sql_seconds"] * 1000:.2f};desc="{stats["queries"]} queries", '
+                f'conn;dur={stats["connect_seconds"] * 1000:.2f}, '
+                f'write;dur={stats["write_seconds"] * 1000:.2f}, '
+                f'render;dur={stats["render_seconds"] * 1000:.2f}, '
+                f'total;dur={elapsed * 1000:.2f}'
+            )
+        return response
+
+    @app.teardown_request
+    def clear_request_metrics(exception=None):
+        _current.stats = None
+
+    def render_started(sender, template, context, **extra):
+        stats = getattr(_current, 'stats', None)
+        if stats is not None:
+            stats['render_started'].append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        stats = getattr(_current, 'stats', None)
+        if stats is None or not stats['render_started']:
+            return
+        elapsed = time.perf_counter() - stats['render_started'].pop()
+        # Only the outermost render counts towards the request total
+        if not stats['render_started']:
+            stats['render_seconds'] += elapsed
+        RENDER_SECONDS.observe(elapsed, template.name or 'string')
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+            return Response("unauthorized\n", status=401, mimetype='text/plain')
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,495 @@
+# migrations.py
+# Versioned schema migrations, tracked with PRAGMA user_version.
+#
+# Each migration runs in its own transaction together with the user_version
+# bump, so a database is always at exactly one version. To change the schema,
+# append a new (version, description, function) entry to MIGRATIONS; never
+# edit a migration that has already shipped.
+import sqlite3
+
+from db import RECOMPUTE_RATING_AGGREGATES_SQL, encode_body, make_excerpt, register_sql_functions
+
+def _add_column_if_missing(cur, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN for databases created before the column existed."""
+    cur.execute(f"PRAGMA table_info({table})")
+    if column in [row[1] for row in cur.fetchall()]:
+        return False
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+def _baseline_schema(cur):
+    # Tables, triggers and view as they were before versioned migrations.
+    # Every statement is idempotent, so this also brings databases created by
+    # older versions of create_schema() up to date.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            join_date DATE DEFAULT CURRENT_DATE,
+            profile_picture TEXT DEFAULT '',
+            bio TEXT DEFAULT ''
+        )
+    """)
+    
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS articles (
+            article_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            contents TEXT NOT NULL,
+            author_name TEXT NOT NULL,
+            publication_date DATE DEFAULT CURRENT_DATE,
+            submitter_id INTEGER,
+            source_link TEXT,
+            overall_rating REAL DEFAULT 0,
+            is_fake INTEGER DEFAULT 0,
+            ml_score REAL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rating_count INTEGER NOT NULL DEFAULT 0,
+            ml_status TEXT NOT NULL DEFAULT 'pending',
+            ml_queued_at REAL,
+            FOREIGN KEY (submitter_id) REFERENCES users(user_id)
+        )
+    """)
+    
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_name TEXT UNIQUE NOT NULL,
+            description TEXT DEFAULT ''
+        )
+    """)
+    
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS article_category (
+            article_id INTEGER,
+            category_id INTEGER,
+            PRIMARY KEY (article_id, category_id),
+            FOREIGN KEY (article_id) REFERENCES articles(article_id),
+            FOREIGN KEY (category_id) REFERENCES categories(category_id)
+        )
+    """)
+    
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ratings (
+            rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            article_id INTEGER,
+            user_id INTEGER,
+            rating_value INTEGER CHECK(rating_value >= 1 AND rating_value <= 5),
+            comment TEXT,
+            rating_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (article_id) REFERENCES articles(article_id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            UNIQUE(article_id, user_id)
+        )
+    """)
+    
+    # ML scoring state: 'pending' articles are picked up by the scoring queue,
+    # then become 'scored' (or 'failed'). ml_queued_at is a unix timestamp.
+    if _add_column_if_missing(cur, 'articles', 'ml_status', "TEXT NOT NULL DEFAULT 'pending'"):
+        # Articles from before the queue already carry a score
+        cur.execute("UPDATE articles SET ml_status = 'scored'")
+    _add_column_if_missing(cur, 'articles', 'ml_queued_at', 'REAL')
+    
+    # Progress of resumable batch jobs (e.g. rescore_articles.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job_name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Rating aggregates: overall_rating = rating_sum / rating_count, maintained
+    # by triggers in the same transaction as every ratings insert/update/delete
+    added_sum = _add_column_if_missing(cur, 'articles', 'rating_sum', 'INTEGER NOT NULL DEFAULT 0')
+    added_count = _add_column_if_missing(cur, 'articles', 'rating_count', 'INTEGER NOT NULL DEFAULT 0')
+    
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS ratings_aggregate_insert AFTER INSERT ON ratings BEGIN
+            UPDATE articles
+            SET rating_sum = rating_sum + new.rating_value,
+                rating_count = rating_count + 1,
+                overall_rating = ROUND((rating_sum + new.rating_value) * 1.0 / (rating_count + 1), 2)
+            WHERE article_id = new.article_id;
+        END
+    """)
+    
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS ratings_aggregate_delete AFTER DELETE ON ratings BEGIN
+            UPDATE articles
+            SET rating_sum = rating_sum - old.rating_value,
+                rating_count = rating_count - 1,
+                overall_rating = CASE WHEN rating_count > 1
+                    THEN ROUND((rating_sum - old.rating_value) * 1.0 / (rating_count - 1), 2)
+                    ELSE 0 END
+            WHERE article_id = old.article_id;
+        END
+    """)
+    
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS ratings_aggregate_update
+        AFTER UPDATE OF rating_value, article_id ON ratings BEGIN
+            UPDATE articles
+            SET rating_sum = rating_sum - old.rating_value,
+                rating_count = rating_count - 1,
+                overall_rating = CASE WHEN rating_count > 1
+                    THEN ROUND((rating_sum - old.rating_value) * 1.0 / (rating_count - 1), 2)
+                    ELSE 0 END
+            WHERE article_id = old.article_id;
+            UPDATE articles
+            SET rating_sum = rating_sum + new.rating_value,
+                rating_count = rating_count + 1,
+                overall_rating = ROUND((rating_sum + new.rating_value) * 1.0 / (rating_count + 1), 2)
+            WHERE article_id = new.article_id;
+        END
+    """)
+    
+    # Databases that already had ratings get their aggregates backfilled once
+    if added_sum or added_count:
+        for statement in RECOMPUTE_RATING_AGGREGATES_SQL:
+            cur.execute(statement)
+    
+    # Full-text index over article text, kept in sync with `articles` by triggers
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='articles_fts'")
+    fts_exists = cur.fetchone() is not None
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+            title,
+            contents,
+            author_name,
+            content='articles',
+            content_rowid='article_id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts (rowid, title, contents, author_name)
+            VALUES (new.article_id, new.title, new.contents, new.author_name);
+        END
+    """)
+    
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, contents, author_name)
+            VALUES ('delete', old.article_id, old.title, old.contents, old.author_name);
+        END
+    """)
+    
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS articles_fts_update
+        AFTER UPDATE OF title, contents, author_name ON articles BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, contents, author_name)
+            VALUES ('delete', old.article_id, old.title, old.contents, old.author_name);
+            INSERT INTO articles_fts (rowid, title, contents, author_name)
+            VALUES (new.article_id, new.title, new.contents, new.author_name);
+        END
+    """)
+    
+    # Existing databases get their articles indexed the first time the table is created
+    if not fts_exists:
+        cur.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+    
+    # Create view for low credibility articles
+    cur.execute("""
+        CREATE VIEW IF NOT EXISTS v_low_credibility AS
+        SELECT 
+            a.article_id,
+            a.title,
+            a.contents,
+            a.author_name,
+            a.publication_date,
+            a.overall_rating,
+            a.is_fake,
+            a.submitter_id,
+            u.username as submitter_name,
+            a.ml_score,
+            a.source_link
+        FROM articles a
+        LEFT JOIN users u ON a.submitter_id = u.user_id
+        WHERE a.is_fake = 1 OR a.overall_rating < 3
+        ORDER BY a.publication_date DESC
+    """)
+
+def _add_indexes(cur):
+    # user_profile lists a user's ratings newest first; get_top_3_users counts
+    # ratings per user from the same index without touching the table
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ratings_user_date ON ratings (user_id, rating_date)")
+    
+    # Dashboard keyset pagination and every list ordered by publication date
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_articles_pub_date ON articles (publication_date, article_id)")
+    
+    # Articles in a category (article_id -> category is covered by the primary key)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_article_category_category ON article_category (category_id, article_id)")
+    
+    # Articles submitted by a user
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_articles_submitter ON articles (submitter_id)")
+    
+    # min_rating filter in search
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_articles_overall_rating ON articles (overall_rating)")
+    
+    # Exactly the rows of v_low_credibility, already in display order
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_articles_low_credibility ON articles (publication_date)
+        WHERE is_fake = 1 OR overall_rating < 3
+    """)
+    
+    # Scoring queue: pending articles in claim order
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_articles_ml_pending ON articles (article_id)
+        WHERE ml_status = 'pending'
+    """)
+
+def _add_user_roles(cur):
+    # Replaces the hard-coded 'admin_user' username checks
+    _add_column_if_missing(cur, 'users', 'role', "TEXT NOT NULL DEFAULT 'user'")
+    cur.execute("UPDATE users SET role = 'admin' WHERE username = 'admin_user'")
+
+# Articles moved per batch while splitting bodies out of the articles table
+BODY_MIGRATION_BATCH = 1000
+
+def _split_article_bodies(cur):
+    # List pages only need the summary columns, so the bodies (most of the
+    # database) move to article_bodies, compressed, and articles keeps a short
+    # excerpt. The search index now reads bodies through article_body().
+    register_sql_functions(cur.connection)
+
+    for trigger in ('articles_fts_insert', 'articles_fts_delete', 'articles_fts_update'):
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cur.execute("DROP VIEW IF EXISTS v_low_credibility")
+    cur.execute("DROP TABLE IF EXISTS articles_fts")
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS article_bodies (
+            article_id INTEGER PRIMARY KEY,
+            body BLOB NOT NULL,
+            compression TEXT NOT NULL DEFAULT 'none',
+            FOREIGN KEY (article_id) REFERENCES articles(article_id)
+        )
+    """)
+    _add_column_if_missing(cur, 'articles', 'excerpt', "TEXT NOT NULL DEFAULT ''")
+
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT article_id, contents FROM articles
+            WHERE article_id > ?
+            ORDER BY article_id
+            LIMIT ?
+        """, (last_id, BODY_MIGRATION_BATCH))
+        rows = cur.fetchall()
+        if not rows:
+            break
+        cur.executemany("INSERT INTO article_bodies (article_id, body, compression) VALUES (?, ?, ?)",
+                        [(article_id, *encode_body(contents)) for article_id, contents in rows])
+        cur.executemany("UPDATE articles SET excerpt = ? WHERE article_id = ?",
+                        [(make_excerpt(contents), article_id) for article_id, contents in rows])
+        last_id = rows[-1][0]
+    # The space is reused by new rows; VACUUM returns it to the file system
+    cur.execute("ALTER TABLE articles DROP COLUMN contents")
+
+    # What the search index sees: one row per article, body decompressed
+    cur.execute("""
+        CREATE VIEW IF NOT EXISTS articles_fts_content AS
+        SELECT a.article_id, a.title, article_body(b.body, b.compression) AS contents, a.author_name
+        FROM articles a
+        JOIN article_bodies b ON b.article_id = a.article_id
+    """)
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+            title,
+            contents,
+            author_name,
+            content='articles_fts_content',
+            content_rowid='article_id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+
+    # An article is indexed once its body exists, and removed with the body
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS article_bodies_fts_insert AFTER INSERT ON article_bodies BEGIN
+            INSERT INTO articles_fts (rowid, title, contents, author_name)
+            SELECT a.article_id, a.title, article_body(new.body, new.compression), a.author_name
+            FROM articles a WHERE a.article_id = new.article_id;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS article_bodies_fts_delete AFTER DELETE ON article_bodies BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, contents, author_name)
+            SELECT 'delete', a.article_id, a.title, article_body(old.body, old.compression), a.author_name
+            FROM articles a WHERE a.article_id = old.article_id;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS article_bodies_fts_update AFTER UPDATE ON article_bodies BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, contents, author_name)
+            SELECT 'delete', a.article_id, a.title, article_body(old.body, old.compression), a.author_name
+            FROM articles a WHERE a.article_id = old.article_id;
+            INSERT INTO articles_fts (rowid, title, contents, author_name)
+            SELECT a.article_id, a.title, article_body(new.body, new.compression), a.author_name
+            FROM articles a WHERE a.article_id = new.article_id;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS articles_fts_update
+        AFTER UPDATE OF title, author_name ON articles BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, contents, author_name)
+            SELECT 'delete', old.article_id, old.title, article_body(b.body, b.compression), old.author_name
+            FROM article_bodies b WHERE b.article_id = old.article_id;
+            INSERT INTO articles_fts (rowid, title, contents, author_name)
+            SELECT new.article_id, new.title, article_body(b.body, b.compression), new.author_name
+            FROM article_bodies b WHERE b.article_id = new.article_id;
+        END
+    """)
+    # Deleting an article takes its body (and so its index entry) with it,
+    # while the article row is still there for the index delete to read
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS articles_delete_body BEFORE DELETE ON articles BEGIN
+            DELETE FROM article_bodies WHERE article_id = old.article_id;
+        END
+    """)
+    cur.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+
+    cur.execute("""
+        CREATE VIEW IF NOT EXISTS v_low_credibility AS
+        SELECT 
+            a.article_id,
+            a.title,
+            a.excerpt,
+            a.author_name,
+            a.publication_date,
+            a.overall_rating,
+            a.is_fake,
+            a.submitter_id,
+            u.username as submitter_name,
+            a.ml_score,
+            a.source_link
+        FROM articles a
+        LEFT JOIN users u ON a.submitter_id = u.user_id
+        WHERE a.is_fake = 1 OR a.overall_rating < 3
+        ORDER BY a.publication_date DESC
+    """)
+
+def _add_search_indexes(cur):
+    # A submitter's articles newest first, for search by username without a sort
+    cur.execute("DROP INDEX IF EXISTS idx_articles_submitter")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_articles_submitter_date
+        ON articles (submitter_id, publication_date, article_id)
+    """)
+
+    # Search sorted or filtered by ML score; unscored articles have no real score
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_articles_ml_score ON articles (ml_score, article_id)
+        WHERE ml_status = 'scored'
+    """)
+
+def _add_cache_generations(cur):
+    # Per-table change counters, so a process can tell whether its cached copy
+    # of a small table is still current without reading the table again.
+    # Triggers bump them, so every writer counts, including other processes
+    # and scripts that write with plain sqlite3.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO cache_generations (name) VALUES ('categories')")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS categories_generation_{event.lower()}
+            AFTER {event} ON categories BEGIN
+                UPDATE cache_generations SET generation = generation + 1 WHERE name = 'categories';
+            END
+        """)
+
+def _add_soft_delete(cur):
+    # Removing an article or user only sets deleted_at, which every read path
+    # filters on; the purge job deletes the rows (and the ratings and
+    # categories that refer to them) later, a batch at a time
+    _add_column_if_missing(cur, 'articles', 'deleted_at', 'TIMESTAMP')
+    _add_column_if_missing(cur, 'users', 'deleted_at', 'TIMESTAMP')
+
+    # Exactly the rows waiting for the purge job, so finding them costs nothing
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_articles_removed ON articles (article_id)
+        WHERE deleted_at IS NOT NULL
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_removed ON users (user_id)
+        WHERE deleted_at IS NOT NULL
+    """)
+
+    cur.execute("DROP VIEW IF EXISTS v_low_credibility")
+    cur.execute("""
+        CREATE VIEW IF NOT EXISTS v_low_credibility AS
+        SELECT 
+            a.article_id,
+            a.title,
+            a.excerpt,
+            a.author_name,
+            a.publication_date,
+            a.overall_rating,
+            a.is_fake,
+            a.submitter_id,
+            u.username as submitter_name,
+            a.ml_score,
+            a.source_link
+        FROM articles a
+        LEFT JOIN users u ON a.submitter_id = u.user_id
+        WHERE (a.is_fake = 1 OR a.overall_rating < 3) AND a.deleted_at IS NULL
+        ORDER BY a.publication_date DESC
+    """)
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline_schema),
+    (2, "secondary indexes for hot queries", _add_indexes),
+    (3, "user roles", _add_user_roles),
+    (4, "article bodies stored apart from articles, compressed", _split_article_bodies),
+    (5, "indexes for search filters and sort orders", _add_search_indexes),
+    (6, "change counters for cached reference tables", _add_cache_generations),
+    (7, "soft delete for articles and users", _add_soft_delete),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, verbose=True):
+    """
+    Apply every migration newer than the database's user_version.
+    Returns the list of versions applied.
+    """
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None  # explicit BEGIN/COMMIT so DDL is transactional too
+    applied = []
+    try:
+        for version, description, migration in MIGRATIONS:
+            cur = conn.cursor()
+            # IMMEDIATE takes the write lock before re-checking the version, so
+            # two processes starting at once don't both apply the same migration
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) >= version:
+                    cur.execute("ROLLBACK")
+                    continue
+                migration(cur)
+                cur.execute(f"PRAGMA user_version = {int(version)}")
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            applied.append(version)
+            if verbose:
+                print(f"Applied migration {version}: {description}")
+    finally:
+        conn.isolation_level = previous_isolation
+    return applied
@@ -0,0 +1,343 @@
+# ml.py
+# Credibility model: a TF-IDF + LogisticRegression pipeline loaded once per
+# worker process and kept warm for every request served by that process.
+#
+# The model is preferably loaded from the memory-mapped array format written by
+# convert_model.py (see MappedModel below); the pickle is the fallback.
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+MODEL_PATH = os.environ.get(
+    'UNFAKE_MODEL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_model.pkl')
+)
+MODEL_DIR = os.environ.get(
+    'UNFAKE_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_model')
+)
+
+# Per-call budget for scoring a submitted article; past it we fall back
+SCORE_BUDGET_SECONDS = float(os.environ.get('UNFAKE_ML_BUDGET_MS', '250')) / 1000.0
+FALLBACK_SCORE = 0.5
+
+# Label the model uses for credible articles
+CREDIBLE_LABEL = 1
+
+_model_pipeline = None
+_credible_column = None
+_model_lock = threading.Lock()
+
+# Scoring runs on a small dedicated pool so a slow model can't hold up the
+# request thread for longer than the budget.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ml-score')
+
+_stats_lock = threading.Lock()
+_stats = {
+    'model_source': None,
+    'load_seconds': None,
+    'inference_calls': 0,
+    'inference_texts': 0,
+    'inference_seconds_total': 0.0,
+    'inference_seconds_max': 0.0,
+    'budget_timeouts': 0,
+    'errors': 0,
+}
+
+def _train_default_pipeline():
+    # sklearn is only needed when there is no exported model to load
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    data = [
+        ("Breaking news about economy stocks soared", 1),
+        ("Click here for cheap pills guaranteed miracle", 0),
+        ("Local election updates show new policies", 1),
+        ("Win big money with one trick", 0),
+        ("Technology advances with new AI model", 1),
+        ("Gossip about celebrities unbelievable secret", 0)
+    ]
+    texts = [d[0] for d in data]
+    labels = [d[1] for d in data]
+
+    vec = TfidfVectorizer()
+    clf = LogisticRegression()
+    pipeline = Pipeline([
+        ("tfidf", vec),
+        ("clf", clf)
+    ])
+    pipeline.fit(texts, labels)
+    return pipeline
+
+# ============ MEMORY-MAPPED MODEL FORMAT ============
+#
+# A model directory holds:
+#   vocabulary.npy  terms as UTF-8 bytes (fixed width), sorted bytewise
+#   idf.npy         IDF weight of each term, in vocabulary order
+#   coef.npy        logistic regression coefficient of each term, same order
+#   meta.json       tokenizer settings, intercept, classes, source pickle hash
+# The arrays are opened with mmap, so every worker process shares the same
+# pages through the OS page cache and loading does no parsing at all.
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def export_model_arrays(pipeline, directory, source_path=None):
+    """Write a fitted TF-IDF + binary LogisticRegression pipeline as a model directory."""
+    vectorizer = pipeline.steps[0][1]
+    classifier = pipeline.steps[-1][1]
+    params = vectorizer.get_params()
+    if params['analyzer'] != 'word' or params['tokenizer'] is not None or params['preprocessor'] is not None:
+        raise ValueError("only word analyzers with the default tokenizer/preprocessor can be exported")
+    if params['strip_accents'] not in (None, 'ascii', 'unicode'):
+        raise ValueError("custom strip_accents functions cannot be exported")
+    if classifier.coef_.shape[0] != 1:
+        raise ValueError("only binary classifiers can be exported")
+
+    terms = sorted(vectorizer.vocabulary_, key=lambda term: term.encode('utf-8'))
+    columns = np.array([vectorizer.vocabulary_[term] for term in terms], dtype=np.int64)
+    vocabulary = np.array([term.encode('utf-8') for term in terms])
+    idf = vectorizer.idf_[columns] if params['use_idf'] else np.ones(len(terms))
+    coef = classifier.coef_[0][columns]
+    stop_words = vectorizer.get_stop_words()
+
+    meta = {
+        'format_version': 1,
+        'lowercase': params['lowercase'],
+        'strip_accents': params['strip_accents'],
+        'token_pattern': params['token_pattern'],
+        'stop_words': sorted(stop_words) if stop_words else None,
+        'ngram_range': list(params['ngram_range']),
+        'binary': params['binary'],
+        'sublinear_tf': params['sublinear_tf'],
+        'norm': params['norm'],
+        'intercept': float(classifier.intercept_[0]),
+        'classes': [c.item() if hasattr(c, 'item') else c for c in classifier.classes_],
+        'source_sha256': _file_sha256(source_path) if source_path else None,
+    }
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'vocabulary.npy'), vocabulary)
+    np.save(os.path.join(directory, 'idf.npy'), np.ascontiguousarray(idf, dtype=np.float64))
+    np.save(os.path.join(directory, 'coef.npy'), np.ascontiguousarray(coef, dtype=np.float64))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+def _strip_accents_unicode(text):
+    normalized = unicodedata.normalize('NFKD', text)
+    if normalized == text:
+        return text
+    return ''.join(c for c in normalized if not unicodedata.combining(c))
+
+def _strip_accents_ascii(text):
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
+
+
+class MappedModel:
+    """
+    Scores texts from a model directory with the same arithmetic as the
+    sklearn pipeline it was exported from. Exposes classes_ and
+    predict_proba() so it is a drop-in replacement for the pipeline.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.vocabulary = np.load(os.path.join(directory, 'vocabulary.npy'), mmap_mode='r')
+        self.idf = np.load(os.path.join(directory, 'idf.npy'), mmap_mode='r')
+        self.coef = np.load(os.path.join(directory, 'coef.npy'), mmap_mode='r')
+        self.classes_ = np.array(self.meta['classes'])
+        self.intercept = self.meta['intercept']
+        self._term_width = self.vocabulary.dtype.itemsize
+        self._token_pattern = re.compile(self.meta['token_pattern'])
+        self._stop_words = frozenset(self.meta['stop_words'] or ())
+        self._strip_accents = {
+            'unicode': _strip_accents_unicode,
+            'ascii': _strip_accents_ascii,
+        }.get(self.meta['strip_accents'])
+
+    def analyze(self, text):
+        """Same terms as TfidfVectorizer.build_analyzer() for the exported settings."""
+        if self.meta['lowercase']:
+            text = text.lower()
+        if self._strip_accents is not None:
+            text = self._strip_accents(text)
+        tokens = self._token_pattern.findall(text)
+        if self._stop_words:
+            tokens = [t for t in tokens if t not in self._stop_words]
+
+        min_n, max_n = self.meta['ngram_range']
+        if max_n == 1:
+            return tokens
+        original = tokens
+        if min_n == 1:
+            tokens = list(original)
+            min_n += 1
+        else:
+            tokens = []
+        for n in range(min_n, min(max_n + 1, len(original) + 1)):
+            for i in range(len(original) - n + 1):
+                tokens.append(" ".join(original[i:i + n]))
+        return tokens
+
+    def decision_function(self, texts):
+        doc_ids, terms = [], []
+        for doc_id, text in enumerate(texts):
+            for term in self.analyze(text):
+                encoded = term.encode('utf-8')
+                # Longer terms cannot be in the vocabulary (and would be truncated)
+                if len(encoded) <= self._term_width:
+                    doc_ids.append(doc_id)
+                    terms.append(encoded)
+
+        n_docs = len(texts)
+        scores = np.full(n_docs, self.intercept, dtype=np.float64)
+        if not terms:
+            return scores
+
+        # Look every term up in the sorted vocabulary with one binary search
+        terms = np.array(terms, dtype=self.vocabulary.dtype)
+        positions = np.searchsorted(self.vocabulary, terms)
+        positions[positions == len(self.vocabulary)] = 0
+        known = self.vocabulary[positions] == terms
+        if not known.any():
+            return scores
+
+        # Term counts per (document, term), like CountVectorizer
+        pairs = np.stack([np.array(doc_ids)[known], positions[known]], axis=1)
+        pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+        docs, columns = pairs[:, 0], pairs[:, 1]
+        weights = counts.astype(np.float64)
+        if self.meta['binary']:
+            weights[:] = 1.0
+        if self.meta['sublinear_tf']:
+            weights = np.log(weights) + 1.0
+        weights *= self.idf[columns]
+
+        norm = self.meta['norm']
+        if norm is not None:
+            if norm == 'l2':
+                lengths = np.sqrt(np.bincount(docs, weights=weights * weights, minlength=n_docs))
+            else:
+                lengths = np.bincount(docs, weights=np.abs(weights), minlength=n_docs)
+            lengths[lengths == 0.0] = 1.0
+            weights /= lengths[docs]
+
+        scores += np.bincount(docs, weights=weights * self.coef[columns], minlength=n_docs)
+        return scores
+
+    def predict_proba(self, texts):
+        positive = 1.0 / (1.0 + np.exp(-self.decision_function(list(texts))))
+        return np.stack([1.0 - positive, positive], axis=1)
+
+def _load_mapped_model():
+    """The exported model, or None if there is none or it is older than the pickle."""
+    if not os.path.exists(os.path.join(MODEL_DIR, 'meta.json')):
+        return None
+    try:
+        model = MappedModel(MODEL_DIR)
+    except Exception as e:
+        print(f"Error loading ML model from {MODEL_DIR}: {e}")
+        return None
+    source_hash = model.meta.get('source_sha256')
+    if source_hash and os.path.exists(MODEL_PATH) and _file_sha256(MODEL_PATH) != source_hash:
+        print(f"{MODEL_DIR} was exported from a different {os.path.basename(MODEL_PATH)}; "
+              f"run convert_model.py to refresh it")
+        return None
+    return model
+
+def load_or_train_ml_model():
+    """
+    Load the model into this process (once). Uses the memory-mapped export if
+    there is an up-to-date one, else the pickle, else trains the small
+    built-in model.
+    """
+    global _model_pipeline, _credible_column
+    if _model_pipeline is not None:
+        return _model_pipeline
+
+    with _model_lock:
+        if _model_pipeline is not None:
+            return _model_pipeline
+
+        started = time.perf_counter()
+        pipeline = _load_mapped_model()
+        source = MODEL_DIR
+        if pipeline is None and os.path.exists(MODEL_PATH):
+            source = MODEL_PATH
+            try:
+                with open(MODEL_PATH, "rb") as f:
+                    pipeline = pickle.load(f)
+            except Exception as e:
+                print(f"Error loading ML model from {MODEL_PATH}: {e}")
+
+        if pipeline is None:
+            source = 'built-in training data'
+            pipeline = _train_default_pipeline()
+            if not os.path.exists(MODEL_PATH):
+                with open(MODEL_PATH, "wb") as f:
+                    pickle.dump(pipeline, f)
+
+        _credible_column = list(pipeline.classes_).index(CREDIBLE_LABEL)
+        _model_pipeline = pipeline
+        load_seconds = time.perf_counter() - started
+        with _stats_lock:
+            _stats['model_source'] = source
+            _stats['load_seconds'] = load_seconds
+        print(f"ML model loaded from {source} in {load_seconds * 1000:.1f} ms")
+        return _model_pipeline
+
+def score_texts(texts):
+    """
+    Credibility scores (probability of the credible class) for a batch of
+    texts, computed with one vectorizer transform and one predict_proba call.
+    """
+    pipeline = load_or_train_ml_model()
+    started = time.perf_counter()
+    probabilities = pipeline.predict_proba(list(texts))
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        _stats['inference_calls'] += 1
+        _stats['inference_texts'] += len(probabilities)
+        _stats['inference_seconds_total'] += elapsed
+        _stats['inference_seconds_max'] = max(_stats['inference_seconds_max'], elapsed)
+    return [float(p) for p in probabilities[:, _credible_column]]
+
+def ml_analyze_article(contents, source_link):
+    """
+    Score one article within SCORE_BUDGET_SECONDS. Returns FALLBACK_SCORE if
+    the model errors or runs over budget, so a submission never stalls on it.
+    """
+    future = _executor.submit(score_texts, [contents or ""])
+    try:
+        return future.result(timeout=SCORE_BUDGET_SECONDS)[0]
+    except FutureTimeout:
+        with _stats_lock:
+            _stats['budget_timeouts'] += 1
+        print(f"ML scoring exceeded {SCORE_BUDGET_SECONDS * 1000:.0f} ms budget; using fallback score")
+        return FALLBACK_SCORE
+    except Exception as e:
+        with _stats_lock:
+            _stats['errors'] += 1
+        print(f"Error scoring article: {e}")
+        return FALLBACK_SCORE
+
+def get_model_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    calls = stats['inference_calls']
+    stats['inference_seconds_avg'] = stats['inference_seconds_total'] / calls if calls else 0.0
+    return stats
@@ -0,0 +1,8 @@
+# purge_removed.py
+# Delete every removed article and user (and the rows that refer to them)
+# now, without running the web server, in the same batches as the purge worker.
+from purge_worker import purge_worker
+
+if __name__ == "__main__":
+    purged = purge_worker.drain()
+    print(f"{purged} rows of removed articles and users purged.")
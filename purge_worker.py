@@ -0,0 +1,63 @@
+# purge_worker.py
+# Background purge of removed articles and users. Removal only hides rows
+# (deleted_at); a worker thread then deletes them together with the ratings
+# and category links that refer to them, one bounded batch per transaction,
+# so a large removal never holds the write lock for long.
+#
+# Like the scoring queue, the work list is the tables themselves: rows still
+# marked removed after a crash or restart are purged when the worker starts.
+import os
+import threading
+import time
+
+from db import PURGE_BATCH_SIZE, get_purge_backlog, purge_removed
+from workers import BackgroundWorker
+
+# The worker re-checks for removed rows this often even without a notify() (seconds)
+PURGE_POLL_INTERVAL = float(os.environ.get('UNFAKE_PURGE_POLL_INTERVAL', '60'))
+
+
+class PurgeWorker(BackgroundWorker):
+    def __init__(self, batch_size=PURGE_BATCH_SIZE, poll_interval=PURGE_POLL_INTERVAL):
+        super().__init__('purge-worker', 1, poll_interval)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.stats = {
+            'rows_purged': 0,
+            'batches': 0,
+            'last_batch_rows': 0,
+            'last_batch_seconds': 0.0,
+        }
+
+    def process_batch(self):
+        """Purge one batch. Returns how many rows it deleted or updated."""
+        started = time.perf_counter()
+        rows = sum(purge_removed(self.batch_size).values())
+        if rows:
+            with self._lock:
+                self.stats['rows_purged'] += rows
+                self.stats['batches'] += 1
+                self.stats['last_batch_rows'] = rows
+                self.stats['last_batch_seconds'] = time.perf_counter() - started
+        return rows
+
+    def get_stats(self):
+        articles, users = get_purge_backlog()
+        with self._lock:
+            stats = dict(self.stats)
+        stats['removed_articles'] = articles
+        stats['removed_users'] = users
+        stats['worker_alive'] = self.workers_alive() > 0
+        return stats
+
+
+purge_worker = PurgeWorker()
+
+def start_purge_worker():
+    purge_worker.start()
+
+def notify_purge_worker():
+    purge_worker.notify()
+
+def get_purge_stats():
+    return purge_worker.get_stats()
@@ -0,0 +1,5 @@
+from db import rebuild_search_index
+
+if __name__ == "__main__":
+    count = rebuild_search_index()
+    print(f"Full-text search index rebuilt for {count} articles.")
@@ -0,0 +1,12 @@
+# repair_orphans.py
+# Clean up rows orphaned by deletes that bypassed foreign keys: ratings and
+# category links of articles that no longer exist, bodies without an article,
+# ratings by missing users. Rating aggregates are recomputed afterwards.
+from db import recompute_rating_aggregates, repair_orphans
+
+if __name__ == "__main__":
+    repaired = repair_orphans()
+    for table, rows in repaired.items():
+        print(f"{table}: {rows} orphaned rows repaired")
+    fixed = recompute_rating_aggregates()
+    print(f"Rating aggregates recomputed; {fixed} articles corrected.")
@@ -0,0 +1,5 @@
+from db import recompute_rating_aggregates
+
+if __name__ == "__main__":
+    fixed = recompute_rating_aggregates()
+    print(f"Rating aggregates recomputed; {fixed} articles corrected.")
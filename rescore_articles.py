@@ -0,0 +1,84 @@
+# rescore_articles.py
+# Re-score every article with the current ML model, e.g. after the model changes.
+#
+#   python rescore_articles.py                 # resume from the last checkpoint
+#   python rescore_articles.py --restart       # start again from the first article
+#   python rescore_articles.py --workers 4     # score chunks on a process pool
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from db import (
+    iter_article_texts,
+    update_ml_scores,
+    get_job_checkpoint,
+    clear_job_checkpoint
+)
+from ml import load_or_train_ml_model, score_texts
+
+JOB_NAME = 'rescore_articles'
+
+def score_chunk(chunk):
+    """Vectorize and score one chunk of (article_id, contents) in a single batch."""
+    ids = [article_id for article_id, _ in chunk]
+    scores = score_texts([contents or "" for _, contents in chunk])
+    return list(zip(ids, scores))
+
+def scored_chunks(chunks, workers):
+    """Score chunks in order, keeping at most 2 chunks per worker in flight."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield score_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_or_train_ml_model) as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(score_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+def rescore_articles(chunk_size=1000, commit_every=10000, workers=1, restart=False):
+    if restart:
+        clear_job_checkpoint(JOB_NAME)
+    start_after = get_job_checkpoint(JOB_NAME)
+    if start_after:
+        print(f"Resuming after article_id {start_after}")
+
+    load_or_train_ml_model()
+
+    started = time.perf_counter()
+    total = 0
+    pending = []
+    for scored in scored_chunks(iter_article_texts(start_after, chunk_size), workers):
+        pending.extend(scored)
+        if len(pending) >= commit_every:
+            total += update_ml_scores(pending, job_name=JOB_NAME)
+            pending = []
+            elapsed = time.perf_counter() - started
+            print(f"{total} articles re-scored (up to article_id {scored[-1][0]}), "
+                  f"{total / elapsed:.0f} articles/s")
+    total += update_ml_scores(pending, job_name=JOB_NAME)
+
+    elapsed = time.perf_counter() - started
+    clear_job_checkpoint(JOB_NAME)
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Done: {total} articles re-scored in {elapsed:.1f} s ({rate:.0f} articles/s)")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score all articles with the current ML model.")
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help="articles read and scored per batch (default 1000)")
+    parser.add_argument('--commit-every', type=int, default=10000,
+                        help="scores written per transaction (default 10000)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes used for scoring (default 1, no pool)")
+    parser.add_argument('--restart', action='store_true',
+                        help="ignore the saved checkpoint and start from the first article")
+    args = parser.parse_args()
+    rescore_articles(chunk_size=args.chunk_size, commit_every=args.commit_every,
+                     workers=args.workers, restart=args.restart)
@@ -0,0 +1,107 @@
+# response_cache.py
+# Cache for rendered pages that are the same for every visitor of a kind
+# (/search, /low_credibility, /top_raters, /article/<id>). Entries are keyed by
+# endpoint, view arguments, the non-empty query arguments in sorted order and
+# whether the visitor is anonymous, a user or an admin (the only part of the
+# page layout that depends on the session). They are bounded by
+# UNFAKE_PAGE_CACHE_SIZE (least recently used first out) and
+# UNFAKE_PAGE_CACHE_TTL seconds.
+#
+# Each page is stored under tags such as "articles" or "article:42". The
+# write functions in db.py call invalidate() with the tags they affect, so a
+# rating, a new or removed article, a fake flag or a category change drops
+# exactly the pages that show it. Query results cached with data_cache()
+# (search facet counts) are tagged and invalidated the same way. The cache lives in process memory: with
+# several worker processes, a write only invalidates its own process and the
+# others catch up within the TTL.
+#
+# Cached responses carry an ETag and Last-Modified, so browsers revalidate
+# with If-None-Match / If-Modified-Since and get a 304 without a body.
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+from cache import TaggedCache
+
+PAGE_CACHE_SIZE = int(os.environ.get('UNFAKE_PAGE_CACHE_SIZE', '512'))
+# 0 turns the cache off
+PAGE_CACHE_TTL = float(os.environ.get('UNFAKE_PAGE_CACHE_TTL', '60'))
+
+_pages = TaggedCache(PAGE_CACHE_SIZE, PAGE_CACHE_TTL)
+# Caches made by data_cache(), invalidated together with the pages
+_data_caches = []
+
+
+def data_cache(maxsize, ttl=PAGE_CACHE_TTL):
+    """A TaggedCache for query results that invalidate() and clear() also reach."""
+    cache = TaggedCache(maxsize, ttl)
+    _data_caches.append(cache)
+    return cache
+
+def invalidate(*tags):
+    """Drop every cached page and query result stored under one of tags."""
+    for cache in (_pages, *_data_caches):
+        cache.invalidate(*tags)
+
+def clear():
+    for cache in (_pages, *_data_caches):
+        cache.clear()
+
+def get_page_cache_stats():
+    return {'size': len(_pages), 'hits': _pages.hits, 'misses': _pages.misses,
+            'invalidations': _pages.invalidations}
+
+def _visitor():
+    if 'username' not in session:
+        return 'anon'
+    return 'admin' if session.get('role') == 'admin' else 'user'
+
+def _cache_key():
+    args = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if v))
+    return (request.endpoint, tuple(sorted(request.view_args.items())), args, _visitor())
+
+def _respond(page):
+    body, mimetype, etag, last_modified = page
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Browsers may keep the page but must revalidate it, which costs a 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+def cached_page(*tags):
+    """
+    Cache a GET view's 200 responses under tags. Tags are formatted with the
+    view arguments, e.g. @cached_page('article:{article_id}', 'categories').
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            # Pages with pending flash messages are personal; render them fresh
+            if PAGE_CACHE_TTL <= 0 or request.method != 'GET' or '_flashes' in session:
+                return view(**view_args)
+            page_tags = tuple(tag.format(**view_args) for tag in tags)
+            key = _cache_key()
+            page = _pages.get(key)
+            if page is not None:
+                response = _respond(page)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            # A write that lands while the page renders makes it stale already
+            versions = _pages.versions(page_tags)
+            response = make_response(view(**view_args))
+            if response.status_code == 200 and not response.is_streamed and '_flashes' not in session:
+                body = response.get_data()
+                page = (body, response.mimetype, hashlib.sha1(body).hexdigest(),
+                        datetime.now(timezone.utc).replace(microsecond=0))
+                _pages.put(key, page, page_tags, versions)
+                response = _respond(page)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
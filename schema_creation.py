@@ -1,97 +1,16 @@
 # schema_creation.py
 import sqlite3
-import os
+
+from db import DB_PATH
+from migrations import migrate
 
 def create_schema():
-    # Get the directory where this script is located
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(current_dir, 'unfake.db')
-    
-    # Create a new connection
-    conn = sqlite3.connect(db_path)
+    # Create a new connection (same database file the app uses)
+    conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     
-    # Create tables
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            join_date DATE DEFAULT CURRENT_DATE,
-            profile_picture TEXT DEFAULT '',
-            bio TEXT DEFAULT ''
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS articles (
-            article_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            contents TEXT NOT NULL,
-            author_name TEXT NOT NULL,
-            publication_date DATE DEFAULT CURRENT_DATE,
-            submitter_id INTEGER,
-            source_link TEXT,
-            overall_rating REAL DEFAULT 0,
-            is_fake INTEGER DEFAULT 0,
-            ml_score REAL DEFAULT 0,
-            FOREIGN KEY (submitter_id) REFERENCES users(user_id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS categories (
-            category_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category_name TEXT UNIQUE NOT NULL,
-            description TEXT DEFAULT ''
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS article_category (
-            article_id INTEGER,
-            category_id INTEGER,
-            PRIMARY KEY (article_id, category_id),
-            FOREIGN KEY (article_id) REFERENCES articles(article_id),
-            FOREIGN KEY (category_id) REFERENCES categories(category_id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS ratings (
-            rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            article_id INTEGER,
-            user_id INTEGER,
-            rating_value INTEGER CHECK(rating_value >= 1 AND rating_value <= 5),
-            comment TEXT,
-            rating_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (article_id) REFERENCES articles(article_id),
-            FOREIGN KEY (user_id) REFERENCES users(user_id),
-            UNIQUE(article_id, user_id)
-        )
-    """)
-    
-    # Create view for low credibility articles
-    cur.execute("""
-        CREATE VIEW IF NOT EXISTS v_low_credibility AS
-        SELECT 
-            a.article_id,
-            a.title,
-            a.contents,
-            a.author_name,
-            a.publication_date,
-            a.overall_rating,
-            a.is_fake,
-            a.submitter_id,
-            u.username as submitter_name,
-            a.ml_score,
-            a.source_link
-        FROM articles a
-        LEFT JOIN users u ON a.submitter_id = u.user_id
-        WHERE a.is_fake = 1 OR a.overall_rating < 3
-        ORDER BY a.publication_date DESC
-    """)
+    # Bring the schema up to the latest version
+    migrate(conn)
     
     # Insert default categories if they don't exist
     default_categories = [
@@ -111,9 +30,12 @@ def create_schema():
         cur.execute("INSERT OR IGNORE INTO categories (category_name, description) VALUES (?, ?)", 
                    (category_name, description))
     
-    # Create admin user if it doesn't exist
-    cur.execute("INSERT OR IGNORE INTO users (username, password, email) VALUES (?, ?, ?)",
-                ('admin_user', 'admin123', 'admin@unfake.com'))
+    # Create admin user if it doesn't exist (checked first: an ignored INSERT
+    # still uses up an AUTOINCREMENT id, so every rerun would skip one)
+    cur.execute("""
+        INSERT INTO users (username, password, email, role)
+        SELECT ?, ?, ?, 'admin' WHERE NOT EXISTS (SELECT 1 FROM users WHERE username = ?)
+    """, ('admin_user', 'admin123', 'admin@unfake.com', 'admin_user'))
     
     # Commit changes and close connection
     conn.commit()
@@ -0,0 +1,13 @@
+# score_pending.py
+# Score every article still waiting in the ML scoring queue, without running
+# the web server (e.g. after a crash or when the workers were disabled).
+import sys
+
+from db import requeue_failed_articles
+from scoring_queue import scoring_queue
+
+if __name__ == "__main__":
+    if '--retry-failed' in sys.argv:
+        print(f"{requeue_failed_articles()} failed articles queued again.")
+    scored = scoring_queue.drain()
+    print(f"{scored} pending articles scored.")
@@ -0,0 +1,107 @@
+# scoring_queue.py
+# Background ML scoring. Submissions are committed with ml_status = 'pending';
+# worker threads pick pending articles up in micro-batches, score them with one
+# predict_proba call per batch and write the scores back.
+#
+# The queue lives in the articles table itself, so nothing is lost on a crash:
+# whatever was not written back is still 'pending' when the workers restart.
+import os
+import threading
+import time
+
+from db import (
+    get_pending_articles,
+    update_ml_scores,
+    mark_ml_failed,
+    get_scoring_backlog
+)
+from ml import load_or_train_ml_model, score_texts
+from workers import BackgroundWorker
+
+SCORING_WORKERS = int(os.environ.get('UNFAKE_SCORING_WORKERS', '2'))
+SCORING_BATCH_SIZE = int(os.environ.get('UNFAKE_SCORING_BATCH_SIZE', '32'))
+# Workers re-check the table this often even without a notify() (seconds)
+SCORING_POLL_INTERVAL = float(os.environ.get('UNFAKE_SCORING_POLL_INTERVAL', '2'))
+
+
+class ScoringQueue(BackgroundWorker):
+    def __init__(self, workers=SCORING_WORKERS, batch_size=SCORING_BATCH_SIZE,
+                 poll_interval=SCORING_POLL_INTERVAL):
+        super().__init__('scoring-worker', workers, poll_interval)
+        self.batch_size = batch_size
+        # Articles claimed by a worker in this process but not yet written back
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self.stats = {
+            'articles_scored': 0,
+            'articles_failed': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'last_batch_seconds': 0.0,
+        }
+
+    def before_start(self):
+        load_or_train_ml_model()
+
+    def _claim(self):
+        with self._lock:
+            batch = get_pending_articles(self.batch_size, exclude_ids=self._in_flight)
+            self._in_flight.update(article_id for article_id, _ in batch)
+        return batch
+
+    def _release(self, batch):
+        with self._lock:
+            self._in_flight.difference_update(article_id for article_id, _ in batch)
+
+    def process_batch(self):
+        """Claim, score and store one micro-batch. Returns how many articles it held."""
+        batch = self._claim()
+        if not batch:
+            return 0
+        started = time.perf_counter()
+        ids = [article_id for article_id, _ in batch]
+        try:
+            scores = score_texts([contents or "" for _, contents in batch])
+            update_ml_scores(zip(ids, scores))
+        except Exception as e:
+            print(f"Error scoring articles {ids}: {e}")
+            mark_ml_failed(ids)
+            with self._lock:
+                self.stats['articles_failed'] += len(ids)
+        else:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stats['articles_scored'] += len(ids)
+                self.stats['batches'] += 1
+                self.stats['last_batch_size'] = len(ids)
+                self.stats['last_batch_seconds'] = elapsed
+        finally:
+            self._release(batch)
+        return len(batch)
+
+    def drain(self):
+        """Score everything that is pending right now, in the calling thread."""
+        load_or_train_ml_model()
+        return super().drain()
+
+    def get_stats(self):
+        depth, oldest = get_scoring_backlog()
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._in_flight)
+        stats['queue_depth'] = depth
+        stats['lag_seconds'] = time.time() - oldest if oldest else 0.0
+        stats['workers_alive'] = self.workers_alive()
+        return stats
+
+
+scoring_queue = ScoringQueue()
+
+def start_scoring_workers():
+    scoring_queue.start()
+
+def notify_scoring_workers():
+    scoring_queue.notify()
+
+def get_scoring_stats():
+    return scoring_queue.get_stats()
@@ -0,0 +1,331 @@
+# search.py
+# Article search behind /search, /api/v1/search and the exports: the filters
+# and sort orders, assembled into one SQL statement per combination. db.py
+# runs the statements; nothing here touches the database.
+#
+# Every filter is a condition SQLite can answer from an index or with a
+# primary-key probe per candidate row:
+#   - date ranges compare publication_date itself (no DATE() around the
+#     column), so they are ranges on idx_articles_pub_date
+#   - categories are EXISTS semijoins on article_category's primary key, one
+#     per category for "all", one with IN (...) for "any"
+#   - the submitter is looked up by username first and then matched on
+#     idx_articles_submitter_date
+#   - is_fake and the ML-score filters are written with literal values so the
+#     partial indexes on those columns apply
+# and every sort order except relevance walks an index in order, so a keyset
+# page stops after `limit` rows instead of sorting every match.
+import math
+import re
+from datetime import date, timedelta
+
+# Markers wrapped around matched terms by highlight()/snippet();
+# templates turn them into <mark> tags after escaping the text.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+# Title matches weigh more than author and body matches in the BM25 rank
+RANK_SQL = "bm25(articles_fts, 10.0, 1.0, 5.0)"
+
+# sort name -> (sort expression, result column for cursors, descending, cursor value type)
+SORTS = {
+    'relevance': (RANK_SQL, 'rank', False, float),
+    'newest': ("a.publication_date", 'publication_date', True, str),
+    'oldest': ("a.publication_date", 'publication_date', False, str),
+    'rating': ("a.overall_rating", 'overall_rating', True, float),
+    # Least credible first; only scored articles have a meaningful score
+    'ml_score': ("a.ml_score", 'ml_score', False, float),
+}
+
+CATEGORY_MATCHES = ('any', 'all')
+
+# Query-string arguments that are filters (everything search_sql accepts besides sort/after/limit)
+FILTER_ARGS = ('q', 'title', 'category', 'category_match', 'date_from', 'date_to', 'publication_date',
+               'min_rating', 'min_ml_score', 'max_ml_score', 'is_fake', 'username')
+
+SEARCH_COLUMNS = """
+    a.article_id, a.title, a.excerpt, a.author_name,
+    a.publication_date, a.overall_rating, a.is_fake,
+    a.submitter_id, u.username as submitter_name,
+    a.ml_score, a.ml_status, a.source_link
+"""
+
+
+def build_fts_query(text):
+    """
+    Turn free text from the search box into a safe FTS5 MATCH expression.
+    Every word is quoted (so FTS5 operators in user input are inert) and the
+    terms are ANDed together; a trailing * makes a word a prefix query.
+    Returns None if the text contains no searchable words.
+    """
+    terms = []
+    for word, star in re.findall(r"(\w+)(\*?)", text or "", re.UNICODE):
+        terms.append(f'"{word}"*' if star else f'"{word}"')
+    return " ".join(terms) if terms else None
+
+def match_expression(q=None, title=None):
+    """The MATCH expression for the text filters: q anywhere, title in titles only; None without either."""
+    anywhere, in_title = build_fts_query(q), build_fts_query(title)
+    parts = [anywhere] if anywhere else []
+    if in_title:
+        parts.append(f"{{title}} : ({in_title})")
+    return " AND ".join(parts) or None
+
+def filters_from_args(args):
+    """
+    The filters in a request's query string (or any MultiDict), without empty
+    values. category may be repeated or comma-separated.
+    """
+    filters = {}
+    for name in FILTER_ARGS:
+        if name == 'category':
+            names = [part.strip() for value in args.getlist(name) for part in value.split(',')]
+            value = [n for n in names if n] or None
+        else:
+            value = args.get(name) or None
+        if value is not None:
+            filters[name] = value
+    return filters
+
+def resolve_sort(sort=None, q=None, title=None):
+    """The sort actually used: relevance needs search terms, and it is the default with them."""
+    if match_expression(q, title) is None:
+        return 'newest' if sort in (None, '', 'relevance') else _check_sort(sort)
+    return 'relevance' if not sort else _check_sort(sort)
+
+def _check_sort(sort):
+    if sort not in SORTS:
+        raise ValueError(f"unknown sort: {sort}")
+    return sort
+
+def sort_key(sort, row):
+    """The (sort value, article_id) of a result row, for the next page's cursor."""
+    return (row[SORTS[sort][1]], row['article_id'])
+
+def parse_after(sort, value, article_id):
+    """A keyset cursor from query-string text, with the sort value in its column's type."""
+    if value is None or article_id is None:
+        return None
+    return (SORTS[sort][3](value), int(article_id))
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
+def _parse_number(value, name):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+
+def _parse_flag(value, name):
+    flag = str(value).lower()
+    if flag in ('1', 'true', 'yes'):
+        return 1
+    if flag in ('0', 'false', 'no'):
+        return 0
+    raise ValueError(f"{name} must be 0 or 1")
+
+def _category_names(category):
+    return list(dict.fromkeys([category] if isinstance(category, str) else category))
+
+def _unindexed(sort, column_sort):
+    return "+" if sort is not None and sort != column_sort else ""
+
+def filter_sql(match=None, category=None, category_match='any', date_from=None, date_to=None,
+               publication_date=None, min_rating=None, min_ml_score=None, max_ml_score=None,
+               is_fake=None, username=None, sort=None):
+    """
+    WHERE conditions and params for the search filters, shared by search and
+    export. Expects articles aliased as a and, when match is given,
+    articles_fts in the FROM clause. publication_date is one day, i.e.
+    date_from = date_to. Raises ValueError for a malformed filter value.
+
+    With sort given, rating and ML-score ranges on other columns are kept off
+    their indexes (unary +), so the sort's index drives the query and a page
+    stops after its limit instead of sorting every article in the range.
+    """
+    conditions = []
+    params = []
+    if match:
+        conditions.append("articles_fts MATCH ?")
+        params.append(match)
+    # Removed articles are hidden until the purge job deletes them
+    conditions.append("a.deleted_at IS NULL")
+
+    if category:
+        names = _category_names(category)
+        category_match = category_match or 'any'
+        if category_match not in CATEGORY_MATCHES:
+            raise ValueError("category_match must be 'any' or 'all'")
+        exists = """EXISTS (SELECT 1 FROM article_category ac
+                   JOIN categories c ON ac.category_id = c.category_id
+                   WHERE ac.article_id = a.article_id AND c.category_name {})"""
+        if category_match == 'all':
+            for name in names:
+                conditions.append(exists.format("= ?"))
+                params.append(name)
+        else:
+            conditions.append(exists.format("IN (" + ", ".join("?" * len(names)) + ")"))
+            params.extend(names)
+
+    if publication_date:
+        date_from = date_to = publication_date
+    if date_from:
+        conditions.append("a.publication_date >= ?")
+        params.append(_parse_date(date_from, 'date_from').isoformat())
+    if date_to:
+        # Half-open, so dates stored with a time of day still count as that day
+        conditions.append("a.publication_date < ?")
+        params.append((_parse_date(date_to, 'date_to') + timedelta(days=1)).isoformat())
+
+    if min_rating:
+        conditions.append(f"{_unindexed(sort, 'rating')}a.overall_rating >= ?")
+        params.append(_parse_number(min_rating, 'min_rating'))
+
+    if min_ml_score is not None or max_ml_score is not None:
+        conditions.append("a.ml_status = 'scored'")
+    if min_ml_score is not None:
+        conditions.append(f"{_unindexed(sort, 'ml_score')}a.ml_score >= ?")
+        params.append(_parse_number(min_ml_score, 'min_ml_score'))
+    if max_ml_score is not None:
+        conditions.append(f"{_unindexed(sort, 'ml_score')}a.ml_score <= ?")
+        params.append(_parse_number(max_ml_score, 'max_ml_score'))
+
+    if is_fake is not None:
+        # A literal, not a parameter: the planner only uses a partial index
+        # (idx_articles_low_credibility covers is_fake = 1) for a known value
+        conditions.append(f"a.is_fake = {_parse_flag(is_fake, 'is_fake')}")
+
+    if username:
+        # = (scalar subquery), not IN: one known submitter_id keeps the
+        # index in publication_date order
+        conditions.append("a.submitter_id = (SELECT user_id FROM users WHERE username = ?)")
+        params.append(username)
+    return conditions, params
+
+def check_filters(q=None, title=None, **filters):
+    """Raise ValueError if a filter value is malformed, e.g. before a long export starts."""
+    filter_sql(match_expression(q, title), **filters)
+
+def where_sql(conditions):
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+def search_sql(sort=None, after=None, limit=None, q=None, title=None, **filters):
+    """
+    (sql, params) for one page of search results in the given sort order
+    (see resolve_sort). For keyset paging pass limit and, for later pages,
+    after = sort_key() of the last row.
+    """
+    sort = resolve_sort(sort, q, title)
+    match = match_expression(q, title)
+    expression, _, descending, _ = SORTS[sort]
+    if match:
+        query = f"""
+            SELECT {SEARCH_COLUMNS},
+                   highlight(articles_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}') AS title_highlight,
+                   snippet(articles_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '...', 24) AS snippet,
+                   {RANK_SQL} AS rank
+            FROM articles_fts
+            JOIN articles a ON a.article_id = articles_fts.rowid
+        """
+    else:
+        query = f"SELECT {SEARCH_COLUMNS} FROM articles a"
+    query += " LEFT JOIN users u ON a.submitter_id = u.user_id"
+
+    conditions, params = filter_sql(match, sort=sort if not match else None, **filters)
+    if sort == 'ml_score' and "a.ml_status = 'scored'" not in conditions:
+        conditions.append("a.ml_status = 'scored'")
+    if after is not None:
+        conditions.append(f"({expression}, a.article_id) {'<' if descending else '>'} (?, ?)")
+        params.extend(after)
+    query += where_sql(conditions)
+
+    direction = " DESC" if descending else ""
+    query += f" ORDER BY {'rank' if sort == 'relevance' else expression}{direction}, a.article_id{direction}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+# ============ FACETS ============
+
+# ML scores are counted in this many equal bands between 0 and 1
+ML_SCORE_BANDS = 5
+
+def facet_sql(q=None, title=None, **filters):
+    """
+    (sql, params) for the facet counts of the articles matching the filters,
+    in one statement: the matching articles are collected once into a
+    materialized CTE and each facet is a GROUP BY over it, the results
+    stacked with UNION ALL as (facet, value, count) rows.
+    """
+    match = match_expression(q, title)
+    if match:
+        source = "articles_fts JOIN articles a ON a.article_id = articles_fts.rowid"
+    else:
+        source = "articles a"
+    conditions, params = filter_sql(match, **filters)
+    if filters.get('category') and not match:
+        # Facets count every match, so start from the categories' index entries
+        # (a superset for "all"; the EXISTS conditions still decide)
+        names = _category_names(filters['category'])
+        conditions.insert(0, f"""a.article_id IN (SELECT ac.article_id FROM article_category ac
+                              JOIN categories c ON ac.category_id = c.category_id
+                              WHERE c.category_name IN ({", ".join("?" * len(names))}))""")
+        params[:0] = names
+    query = f"""
+        WITH matched AS MATERIALIZED (
+            SELECT a.article_id, a.overall_rating, a.is_fake, a.ml_status, a.ml_score
+            FROM {source}{where_sql(conditions)}
+        )
+        SELECT 'category' AS facet,
+               (SELECT category_name FROM categories c WHERE c.category_id = ac.category_id) AS value,
+               COUNT(*) AS count
+        FROM matched
+        JOIN article_category ac ON ac.article_id = matched.article_id
+        GROUP BY ac.category_id
+        UNION ALL
+        SELECT 'rating', MIN(CAST(overall_rating AS INTEGER), 5), COUNT(*) FROM matched GROUP BY 2
+        UNION ALL
+        SELECT 'is_fake', is_fake, COUNT(*) FROM matched GROUP BY 2
+        UNION ALL
+        SELECT 'ml_score', MIN(CAST(ml_score * {ML_SCORE_BANDS} AS INTEGER), {ML_SCORE_BANDS - 1}), COUNT(*)
+        FROM matched WHERE ml_status = 'scored' GROUP BY 2
+    """
+    return query, params
+
+def group_facets(rows):
+    """
+    Facet rows from facet_sql as {facet: [{'value', 'count', 'args'}, ...]},
+    where args are the query-string filters that narrow the search to that
+    value. Rating counts are cumulative ("N and up"), like min_rating.
+    """
+    counts = {'category': {}, 'rating': {}, 'is_fake': {}, 'ml_score': {}}
+    for facet, value, count in rows:
+        counts[facet][value] = count
+
+    categories = sorted(counts['category'].items(), key=lambda item: (-item[1], item[0]))
+    ratings = []
+    total = 0
+    for stars in range(5, 0, -1):
+        total += counts['rating'].get(stars, 0)
+        if total:
+            ratings.append({'value': stars, 'count': total, 'args': {'min_rating': stars}})
+    ml_bands = []
+    for band, count in sorted(counts['ml_score'].items()):
+        low, high = band / ML_SCORE_BANDS, (band + 1) / ML_SCORE_BANDS
+        # Bands are half-open but max_ml_score is inclusive: stop just short of
+        # the next band's lower edge, so the link finds exactly the articles counted
+        top = high if band == ML_SCORE_BANDS - 1 else math.nextafter(high, 0)
+        ml_bands.append({'value': f"{low:.1f}-{high:.1f}", 'count': count,
+                         'args': {'min_ml_score': low, 'max_ml_score': top}})
+    return {
+        'category': [{'value': name, 'count': count, 'args': {'category': name}} for name, count in categories],
+        'rating': ratings,
+        'is_fake': [{'value': flag, 'count': count, 'args': {'is_fake': flag}}
+                    for flag, count in sorted(counts['is_fake'].items()) if flag is not None],
+        'ml_score': ml_bands,
+    }
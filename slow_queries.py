@@ -0,0 +1,155 @@
+# slow_queries.py
+# Slow-query log. Statements that take longer than UNFAKE_SLOW_QUERY_MS are
+# written as one JSON object per line to a rotating log file, with redacted
+# parameters, the route being served, the code that ran them and the
+# EXPLAIN QUERY PLAN output. The admin page /admin/slow_queries shows the
+# most recent entries.
+#
+# Timing comes from metrics.InstrumentedCursor, which calls record() at most
+# once per statement, as soon as its execute + fetch time crosses the threshold.
+#
+# Writes run on the writer thread (writer.py), outside the request that made
+# them. The writer captures the route and callers when a write is submitted
+# (capture_context) and sets them while it runs (use_context), so a slow
+# write is logged with the route and code that asked for it.
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 0 turns the log off
+SLOW_QUERY_MS = float(os.environ.get('UNFAKE_SLOW_QUERY_MS', '100'))
+SLOW_QUERY_SECONDS = SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS > 0 else float('inf')
+SLOW_QUERY_LOG = os.environ.get('UNFAKE_SLOW_QUERY_LOG', os.path.join(_APP_DIR, 'logs', 'slow_queries.log'))
+SLOW_QUERY_LOG_BYTES = int(os.environ.get('UNFAKE_SLOW_QUERY_LOG_BYTES', str(5 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Modules whose frames are bookkeeping, not the code that ran the statement
+_SKIP_FILES = {'metrics.py', 'slow_queries.py', 'writer.py'}
+
+# Route and callers of the write the writer thread is running, if any
+_submitted = threading.local()
+
+_logger = logging.getLogger('unfake.slow_queries')
+_logger.propagate = False
+_logger_lock = threading.Lock()
+
+
+def _get_logger():
+    # The file is only created once there is something to write to it
+    with _logger_lock:
+        if _logger.handlers:
+            return _logger
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or '.', exist_ok=True)
+        handler = RotatingFileHandler(SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_BYTES,
+                                      backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        return _logger
+
+def redact(params):
+    """Keep numbers and NULLs (ids, limits); hide text and blobs, which may be personal."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact([value])[0] for key, value in params.items()}
+    redacted = []
+    for value in params:
+        if value is None or isinstance(value, (int, float)):
+            redacted.append(value)
+        elif isinstance(value, (bytes, memoryview)):
+            redacted.append(f"<blob {len(value)} bytes>")
+        else:
+            redacted.append(f"<text {len(str(value))} chars>")
+    return redacted
+
+def _callers(limit=2):
+    """file:line function of the innermost application frames that ran the statement."""
+    callers = []
+    frame = sys._getframe(1)
+    while frame is not None and len(callers) < limit:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and os.path.basename(filename) not in _SKIP_FILES:
+            callers.append(f"{os.path.relpath(filename, _APP_DIR)}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return callers
+
+def _route():
+    if not has_request_context():
+        return None
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    return f"{request.method} {rule}"
+
+def capture_context():
+    """(route, callers) of the current thread, for use_context() on the thread that runs its write."""
+    if SLOW_QUERY_SECONDS == float('inf'):
+        return None
+    return _route(), _callers(limit=3)
+
+@contextmanager
+def use_context(context):
+    """Attribute statements run in this block to a captured (route, callers)."""
+    _submitted.context = context
+    try:
+        yield
+    finally:
+        _submitted.context = None
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN lines for a statement, or [] if it can't be explained."""
+    try:
+        # A plain cursor, so explaining isn't timed or logged itself
+        cur = sqlite3.Cursor(conn)
+        rows = cur.execute("EXPLAIN QUERY PLAN " + sql, params if params is not None else ()).fetchall()
+        cur.close()
+    except sqlite3.Error:
+        return []
+    return [row[3] for row in rows]
+
+def record(conn, sql, params, seconds):
+    entry = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration_ms': round(seconds * 1000, 2),
+        'sql': " ".join(sql.split()),
+        'params': redact(params),
+        'route': _route(),
+        'callers': _callers(),
+        # executemany/executescript carry no single parameter set to explain
+        'plan': explain(conn, sql, params) if params is not None else [],
+    }
+    context = getattr(_submitted, 'context', None)
+    if context is not None:
+        # The write function itself, then the code that submitted it
+        route, callers = context
+        entry['route'] = entry['route'] or route
+        entry['callers'] += callers
+    try:
+        _get_logger().info(json.dumps(entry))
+    except OSError as e:
+        print(f"Error writing slow query log: {e}")
+
+def recent_slow_queries(limit=100):
+    """The newest entries of the current log file, newest first."""
+    try:
+        with open(SLOW_QUERY_LOG, encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
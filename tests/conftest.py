@@ -0,0 +1,11 @@
+# tests/conftest.py
+# The app is a set of flat modules at the repository root; make them importable,
+# and point them at a throwaway database before any test imports db.
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['UNFAKE_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='unfake-tests-'), 'test.db')
+os.environ.setdefault('UNFAKE_SCORING_WORKERS', '0')
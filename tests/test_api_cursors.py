@@ -0,0 +1,62 @@
+# tests/test_api_cursors.py
+# A malformed ?cursor= on any paginated /api/v1 endpoint is a 400 JSON error,
+# never a value handed on to SQLite.
+import base64
+import json
+
+import pytest
+
+from app import app
+from schema_creation import create_schema
+
+PAGINATED = [
+    '/api/v1/articles',
+    '/api/v1/articles/1/ratings',
+    '/api/v1/search?q=a',
+    '/api/v1/low_credibility',
+    '/api/v1/users/1/ratings',
+]
+
+MALFORMED = [
+    [{'a': 1}, 5],
+    [[1], 5],
+    [None, 5],
+    [True, 5],
+    ['2024-01-01', True],
+    ['2024-01-01', '5'],
+    ['2024-01-01'],
+    {'a': 1},
+]
+
+
+def cursor(values):
+    raw = json.dumps(values).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+@pytest.fixture(scope='module')
+def client():
+    # Migrated database with the default admin, no articles
+    create_schema()
+    client = app.test_client()
+    # /articles is for logged-in users only
+    with client.session_transaction() as session:
+        session['username'] = 'admin_user'
+    return client
+
+
+@pytest.mark.parametrize('values', MALFORMED, ids=json.dumps)
+@pytest.mark.parametrize('path', PAGINATED)
+def test_malformed_cursor_is_rejected(client, path, values):
+    separator = '&' if '?' in path else '?'
+    response = client.get(f'{path}{separator}cursor={cursor(values)}')
+    assert response.status_code == 400
+    assert response.json == {'error': 'invalid cursor'}
+
+
+@pytest.mark.parametrize('path', PAGINATED)
+def test_undecodable_cursor_is_rejected(client, path):
+    separator = '&' if '?' in path else '?'
+    response = client.get(f'{path}{separator}cursor=not-base64!')
+    assert response.status_code == 400
+    assert response.json == {'error': 'invalid cursor'}
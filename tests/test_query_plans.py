@@ -0,0 +1,39 @@
+# tests/test_query_plans.py
+# Query-plan regression test: every SELECT the data layer and the pages run
+# against a freshly migrated temporary database must use an index
+# (see check_query_plans.py, which also runs as a standalone script).
+import pytest
+
+# Imported first: it points UNFAKE_DB_PATH at a temporary database before db is loaded
+from check_query_plans import KNOWN_FULL_SCANS, collect_plans, full_scans
+
+
+@pytest.fixture(scope='module')
+def plans():
+    return collect_plans()
+
+
+def test_no_full_table_scans(plans):
+    failures = {statement: problems for statement, _, problems in plans if problems}
+    assert not failures, "queries doing a full table scan:\n" + "\n".join(
+        f"{statement}\n    {', '.join(problems)}" for statement, problems in failures.items())
+
+
+def test_known_full_scans_are_still_run(plans):
+    # A stale entry would hide a future regression of a statement with the same start
+    statements = [statement for statement, _, _ in plans]
+    unused = [prefix for prefix in KNOWN_FULL_SCANS
+              if not any(statement.startswith(prefix) for statement in statements)]
+    assert not unused
+
+
+def test_full_scans():
+    plan = [
+        (2, 0, 0, 'MATERIALIZE matched'),
+        (3, 2, 0, 'SCAN a USING INDEX idx_articles_live'),
+        (7, 0, 0, 'SCAN matched'),
+        (9, 0, 0, 'SCAN c'),
+        (11, 0, 0, 'SCAN ratings'),
+        (13, 0, 0, 'SEARCH r USING INDEX idx_ratings_user (user_id=?)'),
+    ]
+    assert full_scans(plan) == ['SCAN ratings']
@@ -0,0 +1,67 @@
+# workers.py
+# Background worker threads that repeatedly process one batch of work kept in
+# the database (the scoring queue, the purge of removed rows). Subclasses
+# implement process_batch(); the threads run it back to back while it finds
+# work, then sleep until notify() or until poll_interval has passed.
+import threading
+
+
+class BackgroundWorker:
+    def __init__(self, name, workers=1, poll_interval=1.0):
+        self.name = name
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def process_batch(self):
+        """Process one batch; return how many items it held (0 when idle)."""
+        raise NotImplementedError
+
+    def before_start(self):
+        """Called in the starting thread before the worker threads run."""
+
+    def start(self):
+        if self._threads:
+            return
+        self.before_start()
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread_name = f'{self.name}-{i}' if self.workers > 1 else self.name
+            thread = threading.Thread(target=self._run, name=thread_name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake the workers up, e.g. right after new work was committed."""
+        self._wakeup.set()
+
+    def drain(self):
+        """Process everything there is right now, in the calling thread."""
+        total = 0
+        while True:
+            processed = self.process_batch()
+            if not processed:
+                return total
+            total += processed
+
+    def workers_alive(self):
+        return sum(1 for thread in self._threads if thread.is_alive())
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if self.process_batch():
+                    continue
+            except Exception as e:
+                print(f"{self.name} error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
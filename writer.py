@@ -0,0 +1,191 @@
+# writer.py
+# Single writer thread for the database.
+#
+# SQLite runs one write transaction at a time. Under WAL, readers never block
+# writers and writers never block readers, so only writers have to wait for
+# each other. Rather than have request threads queue up on SQLite's write lock
+# (busy timeouts, "database is locked" retries, seconds-long stalls under
+# concurrent /rate and /submit_article traffic), every write is a function
+# handed to DatabaseWriter.run(). One thread owns the process's only
+# read-write connection and runs the functions in the order they were
+# submitted, each in its own transaction. The caller blocks until its function
+# has run and gets its return value back, or its exception re-raised.
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from metrics import record_write, record_write_batch
+from slow_queries import capture_context, use_context
+
+# How long a caller waits for its write to start before giving up (seconds)
+WRITE_TIMEOUT = float(os.environ.get('UNFAKE_DB_WRITE_TIMEOUT', '30'))
+
+
+class DatabaseWriter:
+    def __init__(self, connect, timeout=WRITE_TIMEOUT):
+        self._connect = connect
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'writes': 0, 'errors': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0}
+
+    def run(self, write, *args, **kwargs):
+        """
+        Run write(conn, *args, **kwargs) on the writer thread and return its
+        result. The transaction is committed if it returns, rolled back if it
+        raises.
+        """
+        if getattr(self._local, 'is_writer', False):
+            # A write function calling another write: same connection and transaction
+            return write(self._conn, *args, **kwargs)
+        job = Future()
+        job.timings = (0.0, 0.0)
+        self._start()
+        # The route and callers stay with the write, for the slow-query log
+        self._queue.put((write, args, kwargs, job, time.perf_counter(), capture_context()))
+        try:
+            try:
+                return job.result(self.timeout)
+            except FutureTimeoutError:
+                # Not started yet: drop it. Already running: it finishes, so wait for it.
+                if job.cancel():
+                    self.stats['timeouts'] += 1
+                    raise sqlite3.OperationalError(
+                        f"timed out waiting for the database writer ({self.queue_depth()} writes queued)")
+                return job.result()
+        finally:
+            record_write(*job.timings)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        self._local.is_writer = True
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            write, args, kwargs, job, submitted, context = item
+            if not job.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            try:
+                if self._conn is None:
+                    self._conn = self._connect()
+                with use_context(context):
+                    result = write(self._conn, *args, **kwargs)
+                    self._conn.commit()
+            except BaseException as e:
+                self._rollback()
+                self._finish(job, submitted, started, error=True)
+                job.set_exception(e)
+            else:
+                self._finish(job, submitted, started)
+                job.set_result(result)
+        self._close_connection()
+
+    def _rollback(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.rollback()
+        except sqlite3.Error:
+            # A connection that can't roll back is replaced before the next write
+            self._close_connection()
+
+    def _finish(self, job, submitted, started, error=False):
+        now = time.perf_counter()
+        job.timings = (started - submitted, now - started)
+        self.stats['writes'] += 1
+        self.stats['errors'] += error
+        self.stats['wait_seconds'] += started - submitted
+        self.stats['run_seconds'] += now - started
+
+    def _close_connection(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def close(self):
+        """Let queued writes finish, then stop the thread and close its connection."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['queued'] = self.queue_depth()
+        return stats
+
+
+class WriteBatcher:
+    """
+    Group commit: items submitted within max_delay seconds of each other are
+    written together by one flush(conn, items) call, in one transaction, so
+    they share a single WAL commit. flush returns one result per item; an
+    exception in place of a result is raised to that item's caller only.
+
+    The first caller of a batch waits up to max_delay (or until max_size
+    items have arrived), then hands the whole batch to the writer; the others
+    just wait for their result.
+    """
+
+    def __init__(self, name, run, flush, max_delay, max_size):
+        self.name = name
+        self._run = run
+        self._flush = flush
+        self.max_delay = max_delay
+        self.max_size = max_size
+        self._pending = []
+        self._cond = threading.Condition()
+
+    def submit(self, item):
+        job = Future()
+        with self._cond:
+            self._pending.append((item, job))
+            leader = len(self._pending) == 1
+            if len(self._pending) >= self.max_size:
+                self._cond.notify_all()
+            if leader:
+                deadline = time.monotonic() + self.max_delay
+                while len(self._pending) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+        if leader:
+            self._write(batch)
+        return job.result()
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            results = self._run(self._flush, [item for item, _ in batch])
+        except BaseException as e:
+            for _, job in batch:
+                job.set_exception(e)
+        else:
+            for (_, job), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    job.set_exception(result)
+                else:
+                    job.set_result(result)
+        record_write_batch(self.name, len(batch), time.perf_counter() - started)
@@ -1,4 +1,6 @@
 from app import app
+from scoring_queue import start_scoring_workers
+from purge_worker import start_purge_worker
 from waitress import serve
 from schema_creation import create_schema
 import sqlite3
@@ -13,12 +15,12 @@ def ensure_admin_exists():
         cur = conn.cursor()
         
         # Check if admin user exists
-        cur.execute("SELECT id FROM users WHERE username = 'admin_user'")
+        cur.execute("SELECT user_id FROM users WHERE username = 'admin_user'")
         if not cur.fetchone():
             # Create admin user if doesn't exist
             cur.execute("""
-                INSERT INTO users (username, password, email)
-                VALUES (?, ?, ?)
+                INSERT INTO users (username, password, email, role)
+                VALUES (?, ?, ?, 'admin')
             """, ('admin_user', 'admin123', 'admin@unfake.com'))
             conn.commit()
             print("Admin user created successfully!")
@@ -38,5 +40,11 @@ if __name__ == "__main__":
     create_schema()
     # Ensure admin user exists
     ensure_admin_exists()
+    # Score submitted articles in the background (also picks up rows left
+    # pending by a previous run)
+    start_scoring_workers()
+    # Delete removed articles and users in the background (also finishes
+    # purges a previous run left unfinished)
+    start_purge_worker()
     # Start the server
     serve(app, host='0.0.0.0', port=10000) 
\ No newline at end of file